@@ -8,10 +8,17 @@ pour l'envoi de SMS d'activation.
 import logging
 import os
 from abc import ABC, abstractmethod
-from typing import Union
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Tuple, Union
 
 logger = logging.getLogger(__name__)
 
+# Pool dédié aux SMS de confirmation (best-effort, hors du thread de requête)
+_confirmation_executor = ThreadPoolExecutor(
+    max_workers=2, thread_name_prefix="sms-confirmation"
+)
+
 
 class ISmsGateway(ABC):
     """
@@ -89,6 +96,56 @@ class ISmsGateway(ABC):
         """
         pass
 
+    def send_many(self, messages: List[Tuple[str, str]]) -> List[str]:
+        """
+        Envoie plusieurs codes d'activation en un seul appel.
+
+        L'implémentation par défaut envoie chaque code même si un précédent
+        a échoué ou levé une exception ; les gateways disposant d'une API
+        d'envoi groupé peuvent la surcharger.
+
+        Args:
+            messages: Liste de couples (téléphone, code d'activation)
+
+        Returns:
+            List[str]: Numéros dont l'envoi a échoué (vide si tout a réussi)
+        """
+        failed_phones = []
+        for phone, code in messages:
+            try:
+                sent = self.send_activation_code(phone, code)
+            except Exception as e:
+                logger.warning("Échec envoi du code d'activation pour %s: %s", phone, e)
+                sent = False
+            if not sent:
+                failed_phones.append(phone)
+        return failed_phones
+
+    def send_confirmation_batch(
+        self, messages: List[Tuple[str, str, Optional[str]]]
+    ) -> bool:
+        """
+        Envoie plusieurs SMS de confirmation en un seul appel.
+
+        L'implémentation par défaut envoie chaque message même si un
+        précédent a échoué ; les gateways disposant d'une API d'envoi
+        groupé peuvent la surcharger.
+
+        Args:
+            messages: Liste de triplets (téléphone, type d'opération, détails)
+
+        Returns:
+            bool: True si tous les envois ont réussi, False sinon
+
+        Raises:
+            Exception: En cas d'erreur d'envoi
+        """
+        results = [
+            self.send_confirmation_message(phone, operation_type, details)
+            for phone, operation_type, details in messages
+        ]
+        return all(results)
+
 
 class DummySmsGateway(ISmsGateway):
     """
@@ -108,7 +165,7 @@ class DummySmsGateway(ISmsGateway):
         Returns:
             bool: True (simulation d'envoi réussi)
         """
-        logger.info(f"📱 SMS SIMULÉ - Code d'activation pour {phone}: {code}")
+        logger.info("📱 SMS SIMULÉ - Code d'activation pour %s: %s", phone, code)
         print(f"🔐 Code d'activation pour {phone}: {code}")
         return True
 
@@ -137,14 +194,20 @@ class DummySmsGateway(ISmsGateway):
 
         if redirect_url:
             logger.info(
-                f"📱 SMS SIMULÉ - Code de vérification pour {operation_name} - {phone}: {code}"
+                "📱 SMS SIMULÉ - Code de vérification pour %s - %s: %s",
+                operation_name,
+                phone,
+                code,
             )
-            logger.info(f"🔗 Lien de redirection: {redirect_url}")
+            logger.info("🔗 Lien de redirection: %s", redirect_url)
             print(f"🔐 Code de vérification pour {operation_name} - {phone}: {code}")
             print(f"🔗 Lien: {redirect_url}")
         else:
             logger.info(
-                f"📱 SMS SIMULÉ - Code de vérification pour {operation_name} - {phone}: {code}"
+                "📱 SMS SIMULÉ - Code de vérification pour %s - %s: %s",
+                operation_name,
+                phone,
+                code,
             )
             print(f"🔐 Code de vérification pour {operation_name} - {phone}: {code}")
 
@@ -175,7 +238,7 @@ class DummySmsGateway(ISmsGateway):
         if details:
             message += f" {details}"
 
-        logger.info(f"📱 SMS SIMULÉ - Confirmation - {phone}: {message}")
+        logger.info("📱 SMS SIMULÉ - Confirmation - %s: %s", phone, message)
         print(f"✅ Confirmation - {phone}: {message}")
         return True
 
@@ -257,12 +320,12 @@ class TwilioSmsGateway(ISmsGateway):
             )
 
             logger.info(
-                f"SMS envoyé via Twilio - SID: {message.sid}, Destinataire: {phone}"
+                "SMS envoyé via Twilio - SID: %s, Destinataire: %s", message.sid, phone
             )
             return True
 
         except Exception as e:
-            logger.error(f"Erreur envoi SMS Twilio pour {phone}: {str(e)}")
+            logger.error("Erreur envoi SMS Twilio pour %s: %s", phone, e)
             raise
 
     def send_verification_code(
@@ -311,14 +374,17 @@ class TwilioSmsGateway(ISmsGateway):
             )
 
             logger.info(
-                f"SMS de vérification envoyé via Twilio - SID: {message.sid}, "
-                f"Destinataire: {phone}, Opération: {operation_type}"
+                "SMS de vérification envoyé via Twilio - SID: %s, "
+                "Destinataire: %s, Opération: %s",
+                message.sid,
+                phone,
+                operation_type,
             )
             return True
 
         except Exception as e:
             logger.error(
-                f"Erreur envoi SMS de vérification Twilio pour {phone}: {str(e)}"
+                "Erreur envoi SMS de vérification Twilio pour %s: %s", phone, e
             )
             raise
 
@@ -365,14 +431,17 @@ class TwilioSmsGateway(ISmsGateway):
             )
 
             logger.info(
-                f"SMS de confirmation envoyé via Twilio - SID: {message.sid}, "
-                f"Destinataire: {phone}, Opération: {operation_type}"
+                "SMS de confirmation envoyé via Twilio - SID: %s, "
+                "Destinataire: %s, Opération: %s",
+                message.sid,
+                phone,
+                operation_type,
             )
             return True
 
         except Exception as e:
             logger.error(
-                f"Erreur envoi SMS de confirmation Twilio pour {phone}: {str(e)}"
+                "Erreur envoi SMS de confirmation Twilio pour %s: %s", phone, e
             )
             raise
 
@@ -455,12 +524,89 @@ def generate_redirect_url(token: str, operation_type: str, base_url: str = None)
     return f"{base_url}{endpoint}?token={clean_token_value}"
 
 
+def send_confirmation_in_background(
+    sms_gateway: ISmsGateway, phone: str, operation_type: str, details: str = None
+) -> Future:
+    """
+    Envoie un message de confirmation sans bloquer la requête HTTP.
+
+    Les confirmations sont informatives : un échec est journalisé
+    mais ne remonte pas à l'appelant.
+
+    Args:
+        sms_gateway: Gateway SMS à utiliser
+        phone: Numéro de téléphone de destination
+        operation_type: Type d'opération (password_reset, password_change, phone_change)
+        details: Détails supplémentaires (optionnel)
+
+    Returns:
+        Future: Envoi planifié (résultat True/False, jamais d'exception)
+    """
+
+    def _send() -> bool:
+        try:
+            return sms_gateway.send_confirmation_message(phone, operation_type, details)
+        except Exception as e:
+            logger.warning("Échec envoi SMS de confirmation pour %s: %s", phone, e)
+            return False
+
+    return _confirmation_executor.submit(_send)
+
+
+def send_confirmation_batch_in_background(
+    sms_gateway: ISmsGateway, messages: List[Tuple[str, str, Optional[str]]]
+) -> Future:
+    """
+    Envoie plusieurs messages de confirmation en un seul appel au gateway,
+    sans bloquer la requête HTTP.
+
+    Args:
+        sms_gateway: Gateway SMS à utiliser
+        messages: Liste de triplets (téléphone, type d'opération, détails)
+
+    Returns:
+        Future: Envoi planifié (résultat True/False, jamais d'exception)
+    """
+
+    def _send() -> bool:
+        try:
+            return sms_gateway.send_confirmation_batch(messages)
+        except Exception as e:
+            logger.warning("Échec envoi groupé des SMS de confirmation: %s", e)
+            return False
+
+    return _confirmation_executor.submit(_send)
+
+
+@lru_cache(maxsize=4)
+def _build_sms_gateway(use_dummy: bool) -> ISmsGateway:
+    """
+    Construit le gateway SMS une seule fois par configuration.
+
+    Args:
+        use_dummy: True pour le gateway de développement
+
+    Returns:
+        ISmsGateway: Instance partagée du gateway SMS
+    """
+    if use_dummy:
+        return DummySmsGateway()
+
+    # En production avec Twilio configuré
+    try:
+        return TwilioSmsGateway()
+    except (ImportError, ValueError) as e:
+        logger.warning("Twilio non disponible, utilisation du dummy: %s", e)
+        return DummySmsGateway()
+
+
 def get_sms_gateway() -> ISmsGateway:
     """
     Factory function pour obtenir le gateway SMS approprié.
 
     Retourne DummySmsGateway en développement et TwilioSmsGateway
-    en production selon la configuration.
+    en production selon la configuration. L'instance est mise en cache
+    pour ne pas recréer le client Twilio à chaque requête.
 
     Returns:
         ISmsGateway: Instance du gateway SMS
@@ -468,18 +614,11 @@ def get_sms_gateway() -> ISmsGateway:
     from django.conf import settings
 
     # En mode développement ou si Twilio n'est pas configuré
-    if settings.DEBUG or not all(
+    use_dummy = settings.DEBUG or not all(
         [
             os.getenv("TWILIO_ACCOUNT_SID"),
             os.getenv("TWILIO_AUTH_TOKEN"),
             os.getenv("TWILIO_FROM_NUMBER"),
         ]
-    ):
-        return DummySmsGateway()
-
-    # En production avec Twilio configuré
-    try:
-        return TwilioSmsGateway()
-    except (ImportError, ValueError) as e:
-        logger.warning(f"Twilio non disponible, utilisation du dummy: {e}")
-        return DummySmsGateway()
+    )
+    return _build_sms_gateway(bool(use_dummy))
@@ -6,14 +6,18 @@ pour l'authentification par numéro de téléphone et le système d'activation p
 """
 
 import hashlib
+import hmac
 import secrets
 import uuid
+from datetime import datetime
+from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.db import models
 from django.utils import timezone
 from django.utils.timezone import timedelta
 
 from .managers import UserManager
+from .utils.phone_utils import to_international_phone
 
 
 class User(AbstractBaseUser, PermissionsMixin):
@@ -77,11 +81,25 @@ class User(AbstractBaseUser, PermissionsMixin):
         verbose_name = "Utilisateur"
         verbose_name_plural = "Utilisateurs"
         ordering = ["-date_joined"]
+        constraints = [
+            # Seul le format international normalisé est stocké, ce qui permet
+            # aux recherches par téléphone d'utiliser l'index unique tel quel
+            models.CheckConstraint(
+                condition=models.Q(phone__regex=r"^\+\d+$"),
+                name="users_user_phone_international",
+            ),
+        ]
 
     def __str__(self) -> str:
         """Représentation string de l'utilisateur."""
         return f"{self.first_name} {self.last_name} ({self.phone})"
 
+    def save(self, *args, **kwargs) -> None:
+        """Normalise le numéro de téléphone avant l'écriture en base."""
+        if self.phone:
+            self.phone = to_international_phone(self.phone)
+        super().save(*args, **kwargs)
+
     def get_full_name(self) -> str:
         """Retourne le nom complet de l'utilisateur."""
         return f"{self.first_name} {self.last_name}".strip()
@@ -96,6 +114,11 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.is_staff or self.is_superuser
 
 
+# Empreinte de référence comparée lorsqu'aucun token ne correspond (même
+# longueur qu'un digest SHA256 brut, ne correspond à aucun code)
+_MISSING_TOKEN_CODE_HASH = bytes(32)
+
+
 class VerificationToken(models.Model):
     """
     Modèle unifié pour tous les tokens de vérification (activation, reset password, etc.).
@@ -145,7 +168,9 @@ class VerificationToken(models.Model):
     )
 
     # Code SMS hashé
-    code_hash = models.CharField(max_length=64, help_text="Hash SHA256 du code SMS")
+    code_hash = models.BinaryField(
+        max_length=32, help_text="Empreinte HMAC-SHA256 brute du code SMS"
+    )
 
     # Expiration
     expires_at = models.DateTimeField(
@@ -209,21 +234,30 @@ class VerificationToken(models.Model):
         return str(secrets.randbelow(900000) + 100000)
 
     @classmethod
-    def hash_code(cls, code: str) -> str:
+    def hash_code(cls, code: str) -> bytes:
         """
-        Hache un code de vérification avec SHA256.
+        Hache un code de vérification avec HMAC-SHA256.
+
+        La clé secrète (SMS_CODE_PEPPER) empêche de retrouver les codes à
+        6 chiffres par force brute à partir d'une copie de la base.
 
         Args:
             code: Code de vérification en clair
 
         Returns:
-            str: Hash SHA256 du code
+            bytes: Digest HMAC-SHA256 brut (32 octets)
         """
-        return hashlib.sha256(code.encode()).hexdigest()
+        return hmac.new(
+            settings.SMS_CODE_PEPPER.encode(), code.encode(), hashlib.sha256
+        ).digest()
 
     @classmethod
     def create_token(
-        cls, verification_type: str, user: User = None, phone: str = None
+        cls,
+        verification_type: str,
+        user: User = None,
+        phone: str = None,
+        code_hash: bytes = None,
     ) -> "VerificationToken":
         """
         Crée un nouveau token de vérification.
@@ -232,6 +266,7 @@ class VerificationToken(models.Model):
             verification_type: Type de vérification
             user: Utilisateur associé (optionnel)
             phone: Numéro de téléphone (requis si user est None)
+            code_hash: Hash du code déjà généré par l'appelant (optionnel)
 
         Returns:
             VerificationToken: Token créé
@@ -252,9 +287,9 @@ class VerificationToken(models.Model):
                 verification_type=verification_type, phone=phone, is_used=False
             ).delete()
 
-        # Générer un nouveau code
-        code = cls.generate_code()
-        code_hash = cls.hash_code(str(code))
+        # Générer un nouveau code si l'appelant n'en fournit pas
+        if code_hash is None:
+            code_hash = cls.hash_code(cls.generate_code())
 
         # Calculer l'expiration (10 minutes)
         expires_at = timezone.now() + timedelta(minutes=10)
@@ -334,19 +369,37 @@ class VerificationToken(models.Model):
         Returns:
             bool: True si le code est correct
         """
+        # Comparaison en temps constant, effectuée avant tout autre contrôle
+        # pour ne pas révéler l'état du token par le temps de réponse
+        code_matches = hmac.compare_digest(bytes(self.code_hash), self.hash_code(code))
+
         if self.is_expired():
             return False
 
         if self.is_max_attempts_reached() or self.is_locked or self.is_used:
             return False
 
-        code_hash = self.hash_code(code)
-        is_valid = code_hash == self.code_hash
-
-        if not is_valid:
+        if not code_matches:
             self.increment_attempts()
 
-        return is_valid
+        return code_matches
+
+    @classmethod
+    def verify_code_without_token(cls, code: str) -> bool:
+        """
+        Effectue le même travail que verify_code lorsqu'aucun token n'existe.
+
+        Égalise le temps de réponse entre un token inconnu et un code
+        incorrect afin de ne pas révéler l'existence du token.
+
+        Args:
+            code: Code soumis par le client
+
+        Returns:
+            bool: Toujours False
+        """
+        hmac.compare_digest(_MISSING_TOKEN_CODE_HASH, cls.hash_code(code))
+        return False
 
     def mark_as_used(self) -> None:
         """
@@ -444,12 +497,13 @@ class ActivationToken(models.Model):
         return hashlib.sha256(code.encode()).hexdigest()
 
     @classmethod
-    def create_token(cls, user: User) -> "ActivationToken":
+    def create_token(cls, user: User, code_hash: str = None) -> "ActivationToken":
         """
         Crée un nouveau token d'activation pour un utilisateur.
 
         Args:
             user: Utilisateur pour lequel créer le token
+            code_hash: Hash du code déjà généré par l'appelant (optionnel)
 
         Returns:
             ActivationToken: Token créé
@@ -457,9 +511,9 @@ class ActivationToken(models.Model):
         # Supprimer l'ancien token s'il existe
         cls.objects.filter(user=user).delete()
 
-        # Générer un nouveau code
-        code = cls.generate_code()
-        code_hash = cls.hash_code(str(code))
+        # Générer un nouveau code si l'appelant n'en fournit pas
+        if code_hash is None:
+            code_hash = cls.hash_code(cls.generate_code())
 
         # Calculer l'expiration (10 minutes)
         expires_at = timezone.now() + timedelta(minutes=10)
@@ -493,6 +547,32 @@ class ActivationToken(models.Model):
         """
         return self.attempts >= 5
 
+    @staticmethod
+    def is_send_allowed(last_sent_at: datetime, send_count: int) -> bool:
+        """
+        Applique les règles d'envoi à partir des seules valeurs du token.
+
+        Sans effet de bord : utilisable sur une ligne lue via values().
+
+        Args:
+            last_sent_at: Date du dernier envoi
+            send_count: Nombre d'envois déjà effectués
+
+        Returns:
+            bool: True si un nouveau code peut être envoyé
+        """
+        now = timezone.now()
+
+        # Vérifier le cooldown de 60 secondes
+        if (now - last_sent_at).total_seconds() < 60:
+            return False
+
+        # Vérifier le quota de 5 envois par jour, levé au changement de jour
+        if send_count >= 5:
+            return now.date() > last_sent_at.date()
+
+        return True
+
     def can_send_new_code(self) -> bool:
         """
         Vérifie si un nouveau code peut être envoyé.
@@ -500,21 +580,13 @@ class ActivationToken(models.Model):
         Returns:
             bool: True si possible
         """
-        # Vérifier le cooldown de 60 secondes
-        time_since_last = timezone.now() - self.last_sent_at
-        if time_since_last.total_seconds() < 60:
+        if not self.is_send_allowed(self.last_sent_at, self.send_count):
             return False
 
-        # Vérifier le quota de 5 envois par jour
+        # Quota atteint mais envoi autorisé : nouveau jour, réinitialiser
         if self.send_count >= 5:
-            # Réinitialiser le compteur si c'est un nouveau jour
-            today = timezone.now().date()
-            last_sent_date = self.last_sent_at.date()
-            if today > last_sent_date:
-                self.send_count = 0
-                self.save(update_fields=["send_count"])
-                return True
-            return False
+            self.send_count = 0
+            self.save(update_fields=["send_count"])
 
         return True
 
@@ -537,19 +609,22 @@ class ActivationToken(models.Model):
         Returns:
             bool: True si le code est correct
         """
+        # Comparaison en temps constant, effectuée avant tout autre contrôle
+        # pour ne pas révéler l'état du token par le temps de réponse
+        code_matches = hmac.compare_digest(
+            self.code_hash.encode(), self.hash_code(code).encode()
+        )
+
         if self.is_expired():
             return False
 
         if self.is_max_attempts_reached() or self.is_locked:
             return False
 
-        code_hash = self.hash_code(code)
-        is_valid = code_hash == self.code_hash
-
-        if not is_valid:
+        if not code_matches:
             self.increment_attempts()
 
-        return is_valid
+        return code_matches
 
     def activate_user(self) -> None:
         """
@@ -6,21 +6,165 @@ connexion, activation et gestion des utilisateurs.
 """
 
 import logging
-from typing import Dict, Any, Optional, Tuple
+import operator
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from types import MappingProxyType
+from typing import Dict, Any, List, Mapping, Optional, Tuple
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
 from django.utils import timezone
-from django.db import transaction
+from django.db import (
+    DatabaseError,
+    IntegrityError,
+    close_old_connections,
+    transaction,
+)
+from django.db.models import F
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import User, ActivationToken
-from .gateways.sms import get_sms_gateway
+from .models import User, ActivationToken, VerificationToken
+from .serializers import ProfileUpdateSerializer
+from .utils.phone_utils import to_international_phone
+from .gateways.sms import (
+    generate_redirect_url,
+    get_sms_gateway,
+    send_confirmation_batch_in_background,
+    send_confirmation_in_background,
+)
 
 logger = logging.getLogger(__name__)
 
 # Constantes pour les messages d'erreur
 SMS_SEND_FAILED_ERROR = "Échec de l'envoi du SMS"
+SMS_UNAVAILABLE_ERROR = "Service SMS temporairement indisponible"
 CODE_VERIFICATION_ERROR = "Code de vérification incorrect ou expiré"
 USER_TOKEN_NOT_FOUND_ERROR = "Utilisateur associé au token introuvable"
 
+# Pool dédié à l'écriture de last_login (un seul worker, écritures courtes)
+_last_login_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="last-login"
+)
+
+# Dernière date de connexion en attente d'écriture, par utilisateur : la file
+# du pool ne contient jamais plus d'une tâche par utilisateur, les connexions
+# successives remplacent simplement la date en attente
+_pending_last_logins: Dict[int, datetime] = {}
+_pending_last_logins_lock = threading.Lock()
+
+# Données vides partagées par les réponses standardisées (lecture seule).
+# Les appelants qui doivent modifier "data" doivent fournir leur propre dict.
+_EMPTY_DATA: Mapping[str, Any] = MappingProxyType({})
+
+# Champs exposés dans le profil utilisateur, lus en un seul appel C
+_USER_FIELD_NAMES = (
+    "id",
+    "phone",
+    "first_name",
+    "last_name",
+    "email",
+    "address",
+    "apartment_name",
+    "date_joined",
+    "is_active",
+)
+_USER_FIELDS_GETTER = operator.attrgetter(*_USER_FIELD_NAMES)
+
+# Colonnes lues par la connexion : vérification du mot de passe, mise à jour
+# de last_login puis sérialisation du profil renvoyé au client
+_LOGIN_FIELD_NAMES = ("password", "last_login", *_USER_FIELD_NAMES)
+
+
+def _build_user_data(user: User) -> Dict[str, Any]:
+    """
+    Construit le dictionnaire de profil d'un utilisateur.
+
+    Args:
+        user: Instance de l'utilisateur
+
+    Returns:
+        Dict[str, Any]: Données utilisateur sérialisées
+    """
+    user_data = dict(zip(_USER_FIELD_NAMES, _USER_FIELDS_GETTER(user)))
+    user_data["full_name"] = user.get_full_name()
+    return user_data
+
+
+def _schedule_last_login(user_id: int, last_login: datetime) -> None:
+    """
+    Planifie l'écriture de la date de dernière connexion.
+
+    Une seule tâche est mise en file par utilisateur : si une écriture est
+    déjà en attente, seule sa date est remplacée par la plus récente.
+
+    Args:
+        user_id: Identifiant de l'utilisateur
+        last_login: Date de connexion à enregistrer
+    """
+    with _pending_last_logins_lock:
+        already_queued = user_id in _pending_last_logins
+        _pending_last_logins[user_id] = last_login
+
+    if not already_queued:
+        _last_login_executor.submit(_record_last_login, user_id)
+
+
+def _record_last_login(user_id: int) -> None:
+    """
+    Écrit la date de dernière connexion (exécuté hors du thread de requête).
+
+    Args:
+        user_id: Identifiant de l'utilisateur
+    """
+    with _pending_last_logins_lock:
+        last_login = _pending_last_logins.pop(user_id, None)
+
+    if last_login is None:
+        return
+
+    # Le worker ne passe pas par le cycle requête/réponse de Django : fermer
+    # les connexions inutilisables ou expirées comme le ferait une requête,
+    # sans renoncer à CONN_MAX_AGE
+    close_old_connections()
+    try:
+        User.objects.filter(pk=user_id).update(last_login=last_login)
+    except DatabaseError as e:
+        logger.warning("Échec mise à jour last_login pour %s: %s", user_id, e)
+    finally:
+        close_old_connections()
+
+
+def _send_verification_code(
+    phone: str, code: str, operation_type: str, token_str: str
+) -> None:
+    """
+    Envoie le code de vérification et son lien de redirection par SMS.
+
+    Args:
+        phone: Numéro de téléphone de destination
+        code: Code de vérification en clair
+        operation_type: Type d'opération (password_reset, password_change, ...)
+        token_str: UUID du token sous forme de chaîne
+
+    Raises:
+        ValueError: Si le gateway refuse ou échoue à envoyer le SMS
+    """
+    redirect_url = generate_redirect_url(token_str, operation_type)
+
+    try:
+        sent = get_sms_gateway().send_verification_code(
+            phone, code, operation_type, redirect_url
+        )
+    except Exception as e:
+        # Les gateways ne partagent pas de type d'exception commun
+        logger.error("Erreur du gateway SMS pour %s: %s", phone, e)
+        raise ValueError(SMS_SEND_FAILED_ERROR) from e
+
+    if not sent:
+        raise ValueError(SMS_SEND_FAILED_ERROR)
+
 
 class AuthService:
     """
@@ -36,6 +180,9 @@ class AuthService:
         Enregistre un nouvel utilisateur inactif et génère un token d'activation.
 
         OPÉRATION ATOMIQUE : Si l'envoi SMS échoue, l'utilisateur n'est pas créé.
+        L'utilisateur et son token sont validés en base avant l'envoi pour ne
+        pas garder la transaction ouverte pendant l'appel au gateway SMS ;
+        un échec d'envoi supprime ensuite l'utilisateur (et son token).
 
         Args:
             user_data: Dictionnaire contenant les données utilisateur
@@ -52,25 +199,36 @@ class AuthService:
             user_data_clean = user_data.copy()
             user_data_clean.pop("password_confirm", None)
 
-            # OPÉRATION ATOMIQUE : Transaction qui annule tout si une étape échoue
+            # 1. Créer l'utilisateur (inactif par défaut) et son token
+            # d'activation dans une transaction courte
+            code = ActivationToken.generate_code()
             with transaction.atomic():
-                # 1. Créer l'utilisateur (inactif par défaut)
                 user = User.objects.create_user(**user_data_clean)
+                ActivationToken.create_token(
+                    user, code_hash=ActivationToken.hash_code(code)
+                )
 
-                # 2. Créer le token d'activation et envoyer le SMS
-                # Si cette étape échoue, la transaction entière est annulée
-                ActivationService.create_and_send_activation_code(user)
+            # 2. Envoyer le SMS hors transaction ; en cas d'échec, supprimer
+            # l'utilisateur (le token est supprimé en cascade)
+            try:
+                ActivationService.send_activation_code(user.phone, code)
+            except ValueError:
+                user.delete()
+                raise
 
-                # 3. Si tout s'est bien passé, valider la transaction
-                logger.info(
-                    f"Utilisateur créé et code d'activation envoyé: {user.phone}"
-                )
-                return user
+            logger.info("Utilisateur créé et code d'activation envoyé: %s", user.phone)
+            return user
 
-        except Exception as e:
-            # En cas d'erreur, la transaction est automatiquement annulée
-            logger.error(f"Erreur lors de l'inscription atomique: {str(e)}")
-            raise ValueError(f"Erreur lors de l'inscription: {str(e)}")
+        except ValueError:
+            # Erreur métier déjà explicite : rien n'est conservé en base
+            raise
+        except ValidationError as e:
+            # Erreur de validation du gestionnaire (ex: numéro déjà utilisé)
+            raise ValueError(" ".join(e.messages)) from e
+        except IntegrityError as e:
+            # Inscription concurrente avec le même numéro : transaction annulée
+            logger.error("Erreur lors de l'inscription atomique: %s", e)
+            raise ValueError("Erreur lors de l'inscription") from e
 
     @staticmethod
     def authenticate_user(phone: str, password: str) -> Optional[User]:
@@ -85,22 +243,23 @@ class AuthService:
             Optional[User]: Utilisateur authentifié ou None
         """
         # Nettoyer et formater le numéro de téléphone au format international
-        cleaned_phone = "".join(filter(str.isdigit, phone))
-        international_phone = "+" + cleaned_phone
-
-        try:
-            # Récupérer l'utilisateur par téléphone (format international)
-            user = User.objects.get(phone=international_phone)
-
-            # Vérifier le mot de passe
-            if user.check_password(password) and user.is_active:
-                # Mettre à jour la dernière connexion
-                user.last_login = timezone.now()
-                user.save(update_fields=["last_login"])
-                return user
-
-        except User.DoesNotExist:
-            pass
+        international_phone = to_international_phone(phone)
+
+        # Récupérer l'utilisateur par téléphone (format international), sans
+        # charger les colonnes inutiles à la connexion
+        user = (
+            User.objects.only(*_LOGIN_FIELD_NAMES)
+            .filter(phone=international_phone)
+            .first()
+        )
+
+        # Vérifier le mot de passe
+        if user is not None and user.check_password(password) and user.is_active:
+            # Mettre à jour la dernière connexion hors du chemin de la requête
+            user.last_login = timezone.now()
+            user_id, last_login = user.pk, user.last_login
+            transaction.on_commit(lambda: _schedule_last_login(user_id, last_login))
+            return user
 
         return None
 
@@ -144,18 +303,7 @@ class AuthService:
             Dict[str, Any]: Profil utilisateur sérialisé
         """
         # Créer les données utilisateur manuellement pour éviter les problèmes avec DRF Spectacular
-        return {
-            "id": user.id,
-            "phone": user.phone,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "full_name": user.get_full_name(),
-            "email": user.email,
-            "address": user.address,
-            "apartment_name": user.apartment_name,
-            "date_joined": user.date_joined,
-            "is_active": user.is_active,
-        }
+        return _build_user_data(user)
 
     @staticmethod
     def validate_phone_uniqueness(
@@ -172,15 +320,16 @@ class AuthService:
             bool: True si le numéro est unique
         """
         # Nettoyer et formater le numéro de téléphone au format international
-        cleaned_phone = "".join(filter(str.isdigit, phone))
-        international_phone = "+" + cleaned_phone
+        international_phone = to_international_phone(phone)
 
-        queryset = User.objects.filter(phone=international_phone)
+        # Le numéro est unique : au plus un identifiant, lu via l'index
+        existing_id = (
+            User.objects.filter(phone=international_phone)
+            .values_list("id", flat=True)
+            .first()
+        )
 
-        if exclude_user_id:
-            queryset = queryset.exclude(id=exclude_user_id)
-
-        return not queryset.exists()
+        return existing_id is None or existing_id == exclude_user_id
 
     @staticmethod
     def refresh_user_tokens(refresh_token: str) -> Tuple[User, Dict[str, str]]:
@@ -200,16 +349,23 @@ class AuthService:
             refresh = RefreshToken(refresh_token)
             user = User.objects.get(id=refresh["user_id"])
 
-            # Générer de nouveaux tokens
+            # for_user() enregistre le nouveau jti dans OutstandingToken : il
+            # pourra lui-même être blacklisté à la déconnexion
             new_refresh = RefreshToken.for_user(user)
-            new_access = new_refresh.access_token
 
-            tokens = {"access": str(new_access), "refresh": str(new_refresh)}
+            # Rotation (BLACKLIST_AFTER_ROTATION) : l'ancien token ne peut
+            # plus être réutilisé
+            refresh.blacklist()
+
+            tokens = {
+                "access": str(new_refresh.access_token),
+                "refresh": str(new_refresh),
+            }
 
             return user, tokens
 
-        except Exception as e:
-            raise ValueError(f"Token invalide: {str(e)}")
+        except (TokenError, KeyError, User.DoesNotExist) as e:
+            raise ValueError("Token invalide") from e
 
 
 class ResponseService:
@@ -229,15 +385,17 @@ class ResponseService:
 
         Args:
             message: Message de succès
-            data: Données à retourner
+            data: Données à retourner (mapping vide en lecture seule si None)
             status_code: Code de statut HTTP
 
         Returns:
             Dict[str, Any]: Réponse standardisée
         """
-        response = {"status": "success", "message": message, "data": data or {}}
-
-        return response
+        return {
+            "status": "success",
+            "message": message,
+            "data": data if data is not None else _EMPTY_DATA,
+        }
 
     @staticmethod
     def error_response(
@@ -248,15 +406,17 @@ class ResponseService:
 
         Args:
             message: Message d'erreur
-            errors: Détails des erreurs
+            errors: Détails des erreurs (mapping vide en lecture seule si None)
             status_code: Code de statut HTTP
 
         Returns:
             Dict[str, Any]: Réponse d'erreur standardisée
         """
-        response = {"status": "error", "message": message, "data": errors or {}}
-
-        return response
+        return {
+            "status": "error",
+            "message": message,
+            "data": errors if errors is not None else _EMPTY_DATA,
+        }
 
 
 class ActivationService:
@@ -283,34 +443,121 @@ class ActivationService:
         Raises:
             ValueError: Si l'envoi échoue
         """
-        try:
-            # Générer le code avant de créer le token
-            code = str(ActivationToken.generate_code())
+        # Générer le code avant de créer le token
+        code = ActivationToken.generate_code()
+
+        # OPÉRATION ATOMIQUE : Envoyer le SMS AVANT de créer le token
+        ActivationService.send_activation_code(user.phone, code)
+
+        # Si l'envoi SMS réussit, créer le token d'activation avec le
+        # hash du code envoyé en un seul INSERT
+        ActivationToken.create_token(user, code_hash=ActivationToken.hash_code(code))
+
+        logger.info("Code d'activation envoyé à %s", user.phone)
+        return code
 
-            # OPÉRATION ATOMIQUE : Vérifier d'abord si on peut envoyer le SMS
-            sms_gateway = get_sms_gateway()
+    @staticmethod
+    def send_activation_code(phone: str, code: str) -> None:
+        """
+        Envoie un code d'activation par SMS.
 
-            # Pré-vérifier la disponibilité du gateway SMS
-            if not sms_gateway.is_available():
-                raise ValueError("Service SMS temporairement indisponible")
+        Args:
+            phone: Numéro de téléphone de destination
+            code: Code d'activation en clair
 
-            # Essayer d'envoyer le SMS AVANT de créer le token
-            if not sms_gateway.send_activation_code(user.phone, code):
+        Raises:
+            ValueError: Si le gateway est injoignable ou si l'envoi échoue
+        """
+        try:
+            # Pas de pré-vérification is_available() : l'envoi lui-même
+            # révèle l'indisponibilité, sans aller-retour réseau de plus
+            if not get_sms_gateway().send_activation_code(phone, code):
                 raise ValueError(SMS_SEND_FAILED_ERROR)
 
-            # Si l'envoi SMS réussit, créer le token d'activation
-            token = ActivationToken.create_token(user)
+        except ValueError:
+            raise
+        except OSError as e:
+            logger.error("Gateway SMS injoignable: %s", e)
+            raise ValueError(SMS_UNAVAILABLE_ERROR) from e
+        except Exception as e:
+            logger.error("Erreur lors de l'envoi du code d'activation: %s", e)
+            raise ValueError("Erreur lors de l'envoi du code d'activation") from e
 
-            # Mettre à jour le hash avec le bon code
-            token.code_hash = ActivationToken.hash_code(code)
-            token.save(update_fields=["code_hash"])
+    @staticmethod
+    def create_and_send_activation_codes(
+        users: List[User],
+    ) -> Tuple[List[str], List[User]]:
+        """
+        Crée les tokens d'activation de plusieurs utilisateurs et envoie
+        tous les codes en un seul appel au gateway SMS.
 
-            logger.info(f"Code d'activation envoyé à {user.phone}")
-            return code
+        Les tokens sont validés en base AVANT l'envoi : la transaction n'est
+        jamais maintenue ouverte pendant l'appel réseau. Un échec d'envoi ne
+        supprime donc pas les tokens ; les utilisateurs concernés sont
+        renvoyés pour pouvoir leur proposer un renvoi du code.
 
+        Args:
+            users: Utilisateurs pour lesquels créer un token
+
+        Returns:
+            Tuple[List[str], List[User]]: Codes d'activation générés, dans
+            l'ordre des utilisateurs, et utilisateurs dont l'envoi a échoué
+
+        Raises:
+            ValueError: Si le gateway SMS est injoignable ou en erreur
+        """
+        if not users:
+            return [], []
+
+        codes = [ActivationToken.generate_code() for _ in users]
+
+        now = timezone.now()
+        expires_at = now + timedelta(minutes=10)
+
+        with transaction.atomic():
+            # Remplacer les anciens tokens en un seul INSERT groupé
+            ActivationToken.objects.filter(user__in=users).delete()
+            ActivationToken.objects.bulk_create(
+                [
+                    ActivationToken(
+                        user=user,
+                        code_hash=ActivationToken.hash_code(code),
+                        expires_at=expires_at,
+                        last_sent_at=now,
+                        send_count=1,
+                    )
+                    for user, code in zip(users, codes)
+                ]
+            )
+
+        try:
+            failed_phones = set(
+                get_sms_gateway().send_many(
+                    [(user.phone, code) for user, code in zip(users, codes)]
+                )
+            )
+        except ValueError:
+            raise
+        except OSError as e:
+            logger.error("Gateway SMS injoignable: %s", e)
+            raise ValueError(SMS_UNAVAILABLE_ERROR) from e
         except Exception as e:
-            logger.error(f"Erreur lors de l'envoi du code d'activation: {str(e)}")
-            raise ValueError(f"Erreur lors de l'envoi du code d'activation: {str(e)}")
+            logger.error("Erreur lors de l'envoi groupé des codes d'activation: %s", e)
+            raise ValueError("Erreur lors de l'envoi des codes d'activation") from e
+
+        failed_users = [user for user in users if user.phone in failed_phones]
+        if failed_users:
+            logger.warning(
+                "Échec de l'envoi du code d'activation à %d utilisateur(s): %s",
+                len(failed_users),
+                ", ".join(user.phone for user in failed_users),
+            )
+
+        logger.info(
+            "Codes d'activation envoyés à %d utilisateurs",
+            len(users) - len(failed_users),
+        )
+        return codes, failed_users
 
     @staticmethod
     def verify_activation_code(phone: str, code: str) -> User:
@@ -327,49 +574,43 @@ class ActivationService:
         Raises:
             ValueError: Si la vérification échoue
         """
-        try:
-            # Nettoyer et formater le numéro de téléphone au format international
-            cleaned_phone = "".join(filter(str.isdigit, phone))
-            international_phone = "+" + cleaned_phone
-
-            # Récupérer l'utilisateur
-            try:
-                user = User.objects.get(phone=international_phone)
-            except User.DoesNotExist:
-                raise ValueError("Utilisateur non trouvé")
-
-            # Vérifier si l'utilisateur est déjà activé
-            if user.is_active:
-                raise ValueError("Ce compte est déjà activé")
-
-            # Récupérer le token d'activation
-            try:
-                token = user.activation_token
-            except ActivationToken.DoesNotExist:
-                raise ValueError("Aucun code d'activation en attente")
-
-            # Vérifier le code
-            if not token.verify_code(code):
-                if token.is_expired():
-                    raise ValueError("Le code d'activation a expiré")
-                elif token.is_locked:
-                    raise ValueError(
-                        "Trop de tentatives échouées. Demandez un nouveau code."
-                    )
-                else:
-                    raise ValueError("Code d'activation incorrect")
+        # Nettoyer et formater le numéro de téléphone au format international
+        international_phone = to_international_phone(phone)
+
+        # Récupérer l'utilisateur et son token d'activation en une requête
+        user = (
+            User.objects.filter(phone=international_phone)
+            .select_related("activation_token")
+            .first()
+        )
+        if user is None:
+            raise ValueError("Utilisateur non trouvé")
+
+        # Vérifier si l'utilisateur est déjà activé
+        if user.is_active:
+            raise ValueError("Ce compte est déjà activé")
+
+        # Récupérer le token d'activation
+        token = getattr(user, "activation_token", None)
+        if token is None:
+            raise ValueError("Aucun code d'activation en attente")
+
+        # Vérifier le code
+        if not token.verify_code(code):
+            if token.is_expired():
+                raise ValueError("Le code d'activation a expiré")
+            elif token.is_locked:
+                raise ValueError(
+                    "Trop de tentatives échouées. Demandez un nouveau code."
+                )
+            else:
+                raise ValueError("Code d'activation incorrect")
 
-            # Activer l'utilisateur (supprime automatiquement le token)
-            token.activate_user()
+        # Activer l'utilisateur (supprime automatiquement le token)
+        token.activate_user()
 
-            logger.info(f"Utilisateur activé avec succès: {user.phone}")
-            return user
-
-        except ValueError:
-            raise
-        except Exception as e:
-            logger.error(f"Erreur lors de la vérification du code: {str(e)}")
-            raise ValueError(f"Erreur lors de la vérification du code: {str(e)}")
+        logger.info("Utilisateur activé avec succès: %s", user.phone)
+        return user
 
     @staticmethod
     def resend_activation_code(phone: str) -> None:
@@ -382,58 +623,52 @@ class ActivationService:
         Raises:
             ValueError: Si le renvoi n'est pas possible
         """
-        try:
-            # Nettoyer et formater le numéro de téléphone au format international
-            cleaned_phone = "".join(filter(str.isdigit, phone))
-            international_phone = "+" + cleaned_phone
-
-            # Récupérer l'utilisateur
-            try:
-                user = User.objects.get(phone=international_phone)
-            except User.DoesNotExist:
-                raise ValueError("Utilisateur non trouvé")
-
-            # Vérifier si l'utilisateur est déjà activé
-            if user.is_active:
-                raise ValueError("Ce compte est déjà activé")
-
-            # Récupérer ou créer le token d'activation
-            try:
-                token = user.activation_token
-
-                # Vérifier si un nouveau code peut être envoyé
-                if not token.can_send_new_code():
-                    if token.is_locked:
-                        raise ValueError("Compte verrouillé. Contactez le support.")
-                    else:
-                        raise ValueError("Attendez avant de demander un nouveau code.")
-
-                # Mettre à jour le token pour le renvoi
-                token.send_count += 1
-                token.last_sent_at = timezone.now()
-                token.save(update_fields=["send_count", "last_sent_at"])
-
-            except ActivationToken.DoesNotExist:
-                # Créer un nouveau token
-                token = ActivationToken.create_token(user)
-
-            # Générer un nouveau code et mettre à jour le token
-            code = str(ActivationToken.generate_code())
-            token.code_hash = ActivationToken.hash_code(code)
-            token.save(update_fields=["code_hash"])
-
-            # Envoyer le SMS
-            sms_gateway = get_sms_gateway()
-            if not sms_gateway.send_activation_code(user.phone, code):
-                raise ValueError(SMS_SEND_FAILED_ERROR)
+        # Nettoyer et formater le numéro de téléphone au format international
+        international_phone = to_international_phone(phone)
+
+        # Récupérer l'utilisateur et son token d'activation en une requête
+        user = (
+            User.objects.filter(phone=international_phone)
+            .select_related("activation_token")
+            .first()
+        )
+        if user is None:
+            raise ValueError("Utilisateur non trouvé")
+
+        # Vérifier si l'utilisateur est déjà activé
+        if user.is_active:
+            raise ValueError("Ce compte est déjà activé")
+
+        # Générer le nouveau code avant d'écrire le token
+        code = ActivationToken.generate_code()
+        code_hash = ActivationToken.hash_code(code)
+
+        # Récupérer ou créer le token d'activation
+        token = getattr(user, "activation_token", None)
+        if token is None:
+            # Créer un nouveau token directement avec le bon hash
+            token = ActivationToken.create_token(user, code_hash=code_hash)
+        else:
+            # Vérifier si un nouveau code peut être envoyé
+            if not token.can_send_new_code():
+                if token.is_locked:
+                    raise ValueError("Compte verrouillé. Contactez le support.")
+                else:
+                    raise ValueError("Attendez avant de demander un nouveau code.")
+
+            # Mettre à jour le token pour le renvoi en un seul UPDATE ;
+            # l'incrément est fait en base pour éviter les renvois
+            # concurrents qui écraseraient le compteur
+            ActivationToken.objects.filter(pk=token.pk).update(
+                send_count=F("send_count") + 1,
+                last_sent_at=timezone.now(),
+                code_hash=code_hash,
+            )
 
-            logger.info(f"Code d'activation renvoyé à {user.phone}")
+        # Envoyer le SMS
+        ActivationService.send_activation_code(user.phone, code)
 
-        except ValueError:
-            raise
-        except Exception as e:
-            logger.error(f"Erreur lors du renvoi du code: {str(e)}")
-            raise ValueError(f"Erreur lors du renvoi du code: {str(e)}")
+        logger.info("Code d'activation renvoyé à %s", user.phone)
 
 
 class RateLimitService:
@@ -456,22 +691,16 @@ class RateLimitService:
             Dict[str, Any]: Informations sur les limites
         """
         # Nettoyer et formater au format international
-        cleaned_phone = "".join(filter(str.isdigit, phone))
-        international_phone = "+" + cleaned_phone
+        international_phone = to_international_phone(phone)
 
-        try:
-            user = User.objects.get(phone=international_phone)
-            token = user.activation_token
+        # Lire uniquement les colonnes utiles, sans instancier de modèle
+        token = (
+            ActivationToken.objects.filter(user__phone=international_phone)
+            .values("is_locked", "attempts", "send_count", "last_sent_at", "expires_at")
+            .first()
+        )
 
-            return {
-                "can_send": token.can_send_new_code(),
-                "is_locked": token.is_locked,
-                "attempts": token.attempts,
-                "send_count": token.send_count,
-                "last_sent": token.last_sent_at,
-                "expires_at": token.expires_at,
-            }
-        except (User.DoesNotExist, ActivationToken.DoesNotExist):
+        if token is None:
             return {
                 "can_send": True,
                 "is_locked": False,
@@ -481,6 +710,22 @@ class RateLimitService:
                 "expires_at": None,
             }
 
+        can_send = ActivationToken.is_send_allowed(
+            token["last_sent_at"], token["send_count"]
+        )
+
+        return {
+            "can_send": can_send,
+            "is_locked": token["is_locked"],
+            "attempts": token["attempts"],
+            # Quota levé au changement de jour : le compteur repart de zéro
+            "send_count": (
+                0 if can_send and token["send_count"] >= 5 else token["send_count"]
+            ),
+            "last_sent": token["last_sent_at"],
+            "expires_at": token["expires_at"],
+        }
+
 
 # =============================================================================
 # NOUVEAUX SERVICES POUR LES FONCTIONNALITÉS ÉTENDUES
@@ -496,6 +741,7 @@ class PasswordResetService:
     """
 
     @staticmethod
+    @transaction.atomic
     def request_password_reset(phone: str) -> Dict[str, Any]:
         """
         Demande une réinitialisation de mot de passe.
@@ -509,55 +755,38 @@ class PasswordResetService:
         Raises:
             ValueError: Si la demande échoue
         """
+        # Vérifier si l'utilisateur existe
         try:
-            # Vérifier si l'utilisateur existe
-            try:
-                user = User.objects.get(phone=phone)
-            except User.DoesNotExist:
-                # Pour la sécurité, on retourne toujours un succès
-                # même si l'utilisateur n'existe pas
-                logger.info(f"Demande de reset pour numéro inexistant: {phone}")
-                return {
-                    "success": True,
-                    "message": "Si ce numéro est associé à un compte, vous recevrez un SMS.",
-                }
-
-            # Créer un token de réinitialisation
-            from .models import VerificationToken
-
-            token = VerificationToken.create_token(
-                verification_type="password_reset", user=user
-            )
-
-            # Générer le code et l'envoyer
-            code = VerificationToken.generate_code()
-            token.code_hash = VerificationToken.hash_code(code)
-            token.save(update_fields=["code_hash"])
-
-            # Envoyer le SMS avec lien de redirection
-            sms_gateway = get_sms_gateway()
-            from .gateways.sms import generate_redirect_url
-
-            redirect_url = generate_redirect_url(str(token.token), "password_reset")
-
-            if not sms_gateway.send_verification_code(
-                phone, code, "password_reset", redirect_url
-            ):
-                raise ValueError(SMS_SEND_FAILED_ERROR)
-
-            logger.info(f"Code de réinitialisation envoyé à {phone}")
-
+            user = User.objects.get(phone=phone)
+        except User.DoesNotExist:
+            # Pour la sécurité, on retourne toujours un succès
+            # même si l'utilisateur n'existe pas
+            logger.info("Demande de reset pour numéro inexistant: %s", phone)
             return {
                 "success": True,
-                "message": "Un code de réinitialisation a été envoyé par SMS.",
-                "token": str(token.token),
+                "message": "Si ce numéro est associé à un compte, vous recevrez un SMS.",
             }
 
-        except ValueError:
-            raise
-        except Exception as e:
-            logger.error(f"Erreur lors de la demande de reset: {str(e)}")
-            raise ValueError(f"Erreur lors de la demande de réinitialisation: {str(e)}")
+        # Créer un token de réinitialisation
+        # Générer le code avant la création pour un seul INSERT
+        code = VerificationToken.generate_code()
+        token = VerificationToken.create_token(
+            verification_type="password_reset",
+            user=user,
+            code_hash=VerificationToken.hash_code(code),
+        )
+
+        # Envoyer le SMS avec lien de redirection
+        token_str = str(token.token)
+        _send_verification_code(phone, code, "password_reset", token_str)
+
+        logger.info("Code de réinitialisation envoyé à %s", phone)
+
+        return {
+            "success": True,
+            "message": "Un code de réinitialisation a été envoyé par SMS.",
+            "token": token_str,
+        }
 
     @staticmethod
     def confirm_password_reset(
@@ -577,56 +806,49 @@ class PasswordResetService:
         Raises:
             ValueError: Si la confirmation échoue
         """
+        # Récupérer le token
         try:
-            from .models import VerificationToken
-
-            # Récupérer le token
-            try:
-                token = VerificationToken.objects.get(
-                    token=token_uuid, verification_type="password_reset", is_used=False
-                )
-            except VerificationToken.DoesNotExist:
-                raise ValueError("Token de réinitialisation invalide ou expiré")
-
-            # Vérifier le code
-            if not token.verify_code(code):
-                raise ValueError(CODE_VERIFICATION_ERROR)
-
-            # Vérifier que l'utilisateur existe
-            if not token.user:
-                raise ValueError(USER_TOKEN_NOT_FOUND_ERROR)
-
-            # Changer le mot de passe
-            token.user.set_password(new_password)
-            token.user.save(update_fields=["password"])
+            token = VerificationToken.objects.select_related("user").get(
+                token=token_uuid, verification_type="password_reset", is_used=False
+            )
+        except VerificationToken.DoesNotExist:
+            # Même coût qu'un code incorrect pour ne pas révéler l'absence du token
+            VerificationToken.verify_code_without_token(code)
+            raise ValueError("Token de réinitialisation invalide ou expiré")
+
+        # Vérifier le code
+        if not token.verify_code(code):
+            raise ValueError(CODE_VERIFICATION_ERROR)
+
+        # Vérifier que l'utilisateur existe
+        if not token.user:
+            raise ValueError(USER_TOKEN_NOT_FOUND_ERROR)
+
+        phone = token.user.phone
+        with transaction.atomic():
+            # Changer le mot de passe par un UPDATE direct (aucun signal
+            # post_save n'est attaché au modèle User)
+            hashed_password = make_password(new_password)
+            User.objects.filter(pk=token.user_id).update(password=hashed_password)
+            token.user.password = hashed_password
 
             # Marquer le token comme utilisé
             token.mark_as_used()
 
-            # Envoyer SMS de confirmation
-            sms_gateway = get_sms_gateway()
-            try:
-                sms_gateway.send_confirmation_message(
-                    token.user.phone, "password_reset"
+            # Envoyer SMS de confirmation en arrière-plan (best-effort),
+            # uniquement une fois la transaction validée
+            transaction.on_commit(
+                lambda: send_confirmation_in_background(
+                    get_sms_gateway(), phone, "password_reset"
                 )
-            except Exception as e:
-                # Log l'erreur mais ne pas faire échouer l'opération
-                logger.warning(
-                    f"Échec envoi SMS de confirmation pour {token.user.phone}: {str(e)}"
-                )
-
-            logger.info(f"Mot de passe réinitialisé pour {token.user.phone}")
+            )
 
-            return {
-                "success": True,
-                "message": "Votre mot de passe a été réinitialisé avec succès.",
-            }
+        logger.info("Mot de passe réinitialisé pour %s", token.user.phone)
 
-        except ValueError:
-            raise
-        except Exception as e:
-            logger.error(f"Erreur lors de la confirmation de reset: {str(e)}")
-            raise ValueError(f"Erreur lors de la réinitialisation: {str(e)}")
+        return {
+            "success": True,
+            "message": "Votre mot de passe a été réinitialisé avec succès.",
+        }
 
 
 class PasswordChangeService:
@@ -638,6 +860,7 @@ class PasswordChangeService:
     """
 
     @staticmethod
+    @transaction.atomic
     def request_password_change(user: User, current_password: str) -> Dict[str, Any]:
         """
         Demande un changement de mot de passe.
@@ -652,44 +875,27 @@ class PasswordChangeService:
         Raises:
             ValueError: Si la demande échoue
         """
-        try:
-            # Le mot de passe actuel est déjà validé dans le serializer
-            # Créer un token de changement
-            from .models import VerificationToken
-
-            token = VerificationToken.create_token(
-                verification_type="password_change", user=user
-            )
-
-            # Générer le code et l'envoyer
-            code = VerificationToken.generate_code()
-            token.code_hash = VerificationToken.hash_code(code)
-            token.save(update_fields=["code_hash"])
-
-            # Envoyer le SMS avec lien de redirection
-            sms_gateway = get_sms_gateway()
-            from .gateways.sms import generate_redirect_url
+        # Le mot de passe actuel est déjà validé dans le serializer
+        # Créer un token de changement
+        # Générer le code avant la création pour un seul INSERT
+        code = VerificationToken.generate_code()
+        token = VerificationToken.create_token(
+            verification_type="password_change",
+            user=user,
+            code_hash=VerificationToken.hash_code(code),
+        )
+
+        # Envoyer le SMS avec lien de redirection
+        token_str = str(token.token)
+        _send_verification_code(user.phone, code, "password_change", token_str)
+
+        logger.info("Code de changement de mot de passe envoyé à %s", user.phone)
 
-            redirect_url = generate_redirect_url(str(token.token), "password_change")
-
-            if not sms_gateway.send_verification_code(
-                user.phone, code, "password_change", redirect_url
-            ):
-                raise ValueError(SMS_SEND_FAILED_ERROR)
-
-            logger.info(f"Code de changement de mot de passe envoyé à {user.phone}")
-
-            return {
-                "success": True,
-                "message": "Un code de vérification a été envoyé par SMS.",
-                "token": str(token.token),
-            }
-
-        except ValueError:
-            raise
-        except Exception as e:
-            logger.error(f"Erreur lors de la demande de changement: {str(e)}")
-            raise ValueError(f"Erreur lors de la demande de changement: {str(e)}")
+        return {
+            "success": True,
+            "message": "Un code de vérification a été envoyé par SMS.",
+            "token": token_str,
+        }
 
     @staticmethod
     def confirm_password_change(
@@ -709,56 +915,49 @@ class PasswordChangeService:
         Raises:
             ValueError: Si la confirmation échoue
         """
+        # Récupérer le token
         try:
-            from .models import VerificationToken
-
-            # Récupérer le token
-            try:
-                token = VerificationToken.objects.get(
-                    token=token_uuid, verification_type="password_change", is_used=False
-                )
-            except VerificationToken.DoesNotExist:
-                raise ValueError("Token de changement invalide ou expiré")
-
-            # Vérifier le code
-            if not token.verify_code(code):
-                raise ValueError(CODE_VERIFICATION_ERROR)
-
-            # Vérifier que l'utilisateur existe
-            if not token.user:
-                raise ValueError(USER_TOKEN_NOT_FOUND_ERROR)
-
-            # Changer le mot de passe
-            token.user.set_password(new_password)
-            token.user.save(update_fields=["password"])
+            token = VerificationToken.objects.select_related("user").get(
+                token=token_uuid, verification_type="password_change", is_used=False
+            )
+        except VerificationToken.DoesNotExist:
+            # Même coût qu'un code incorrect pour ne pas révéler l'absence du token
+            VerificationToken.verify_code_without_token(code)
+            raise ValueError("Token de changement invalide ou expiré")
+
+        # Vérifier le code
+        if not token.verify_code(code):
+            raise ValueError(CODE_VERIFICATION_ERROR)
+
+        # Vérifier que l'utilisateur existe
+        if not token.user:
+            raise ValueError(USER_TOKEN_NOT_FOUND_ERROR)
+
+        phone = token.user.phone
+        with transaction.atomic():
+            # Changer le mot de passe par un UPDATE direct (aucun signal
+            # post_save n'est attaché au modèle User)
+            hashed_password = make_password(new_password)
+            User.objects.filter(pk=token.user_id).update(password=hashed_password)
+            token.user.password = hashed_password
 
             # Marquer le token comme utilisé
             token.mark_as_used()
 
-            # Envoyer SMS de confirmation
-            sms_gateway = get_sms_gateway()
-            try:
-                sms_gateway.send_confirmation_message(
-                    token.user.phone, "password_change"
-                )
-            except Exception as e:
-                # Log l'erreur mais ne pas faire échouer l'opération
-                logger.warning(
-                    f"Échec envoi SMS de confirmation pour {token.user.phone}: {str(e)}"
+            # Envoyer SMS de confirmation en arrière-plan (best-effort),
+            # uniquement une fois la transaction validée
+            transaction.on_commit(
+                lambda: send_confirmation_in_background(
+                    get_sms_gateway(), phone, "password_change"
                 )
+            )
 
-            logger.info(f"Mot de passe changé pour {token.user.phone}")
+        logger.info("Mot de passe changé pour %s", token.user.phone)
 
-            return {
-                "success": True,
-                "message": "Votre mot de passe a été changé avec succès.",
-            }
-
-        except ValueError:
-            raise
-        except Exception as e:
-            logger.error(f"Erreur lors de la confirmation de changement: {str(e)}")
-            raise ValueError(f"Erreur lors du changement: {str(e)}")
+        return {
+            "success": True,
+            "message": "Votre mot de passe a été changé avec succès.",
+        }
 
 
 class ProfileService:
@@ -784,43 +983,30 @@ class ProfileService:
         Raises:
             ValueError: Si la mise à jour échoue
         """
-        try:
-            # Valider les données avec le serializer
-            from .serializers import ProfileUpdateSerializer
-
-            serializer = ProfileUpdateSerializer(user, data=profile_data, partial=True)
-
-            if not serializer.is_valid():
-                raise ValueError(f"Données invalides: {serializer.errors}")
-
-            # Mettre à jour et sauvegarder
-            user = serializer.save()
-
-            logger.info(f"Profil mis à jour pour {user.phone}")
-
-            # Créer les données utilisateur manuellement pour éviter les problèmes avec DRF Spectacular
-            user_data = {
-                "id": user.id,
-                "phone": user.phone,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-                "full_name": user.get_full_name(),
-                "email": user.email,
-                "address": user.address,
-                "apartment_name": user.apartment_name,
-                "date_joined": user.date_joined,
-                "is_active": user.is_active,
-            }
+        # Valider les données avec le serializer
+        serializer = ProfileUpdateSerializer(user, data=profile_data, partial=True)
 
-            return {
-                "success": True,
-                "message": "Votre profil a été mis à jour avec succès.",
-                "user": user_data,
-            }
+        if not serializer.is_valid():
+            raise ValueError(f"Données invalides: {serializer.errors}")
 
-        except Exception as e:
-            logger.error(f"Erreur lors de la mise à jour du profil: {str(e)}")
-            raise ValueError(f"Erreur lors de la mise à jour du profil: {str(e)}")
+        # UPDATE ciblé sur les seules colonnes validées plutôt qu'un
+        # save() qui réécrit toute la ligne
+        cleaned = serializer.validated_data
+        if cleaned:
+            User.objects.filter(pk=user.pk).update(**cleaned)
+            for field, value in cleaned.items():
+                setattr(user, field, value)
+
+        logger.info("Profil mis à jour pour %s", user.phone)
+
+        # Créer les données utilisateur manuellement pour éviter les problèmes avec DRF Spectacular
+        user_data = _build_user_data(user)
+
+        return {
+            "success": True,
+            "message": "Votre profil a été mis à jour avec succès.",
+            "user": user_data,
+        }
 
 
 class PhoneChangeService:
@@ -832,6 +1018,7 @@ class PhoneChangeService:
     """
 
     @staticmethod
+    @transaction.atomic
     def request_phone_change(user: User, new_phone: str) -> Dict[str, Any]:
         """
         Demande un changement de numéro de téléphone.
@@ -846,50 +1033,32 @@ class PhoneChangeService:
         Raises:
             ValueError: Si la demande échoue
         """
-        try:
-            # Vérifier que le nouveau numéro n'est pas déjà utilisé
-            # (validation dans le service pour éviter les conditions de course)
-            if User.objects.filter(phone=new_phone).exists():
-                raise ValueError("Ce numéro de téléphone est déjà utilisé")
-
-            # Créer un token de changement de numéro
-            from .models import VerificationToken
-
-            token = VerificationToken.create_token(
-                verification_type="phone_change",
-                user=user,
-                phone=new_phone,  # Stocker le nouveau numéro
-            )
-
-            # Générer le code et l'envoyer
-            code = VerificationToken.generate_code()
-            token.code_hash = VerificationToken.hash_code(code)
-            token.save(update_fields=["code_hash"])
+        # Vérifier que le nouveau numéro n'est pas déjà utilisé
+        # (validation dans le service pour éviter les conditions de course)
+        if User.objects.filter(phone=new_phone).exists():
+            raise ValueError("Ce numéro de téléphone est déjà utilisé")
+
+        # Créer un token de changement de numéro
+        # Générer le code avant la création pour un seul INSERT
+        code = VerificationToken.generate_code()
+        token = VerificationToken.create_token(
+            verification_type="phone_change",
+            user=user,
+            phone=new_phone,  # Stocker le nouveau numéro
+            code_hash=VerificationToken.hash_code(code),
+        )
+
+        # Envoyer le SMS sur le nouveau numéro avec lien de redirection
+        token_str = str(token.token)
+        _send_verification_code(new_phone, code, "phone_change", token_str)
+
+        logger.info("Code de changement de numéro envoyé à %s", new_phone)
 
-            # Envoyer le SMS sur le nouveau numéro avec lien de redirection
-            sms_gateway = get_sms_gateway()
-            from .gateways.sms import generate_redirect_url
-
-            redirect_url = generate_redirect_url(str(token.token), "phone_change")
-
-            if not sms_gateway.send_verification_code(
-                new_phone, code, "phone_change", redirect_url
-            ):
-                raise ValueError(SMS_SEND_FAILED_ERROR)
-
-            logger.info(f"Code de changement de numéro envoyé à {new_phone}")
-
-            return {
-                "success": True,
-                "message": "Un code de vérification a été envoyé sur votre nouveau numéro.",
-                "token": str(token.token),
-            }
-
-        except ValueError:
-            raise
-        except Exception as e:
-            logger.error(f"Erreur lors de la demande de changement de numéro: {str(e)}")
-            raise ValueError(f"Erreur lors de la demande de changement: {str(e)}")
+        return {
+            "success": True,
+            "message": "Un code de vérification a été envoyé sur votre nouveau numéro.",
+            "token": token_str,
+        }
 
     @staticmethod
     def confirm_phone_change(token_uuid: str, code: str) -> Dict[str, Any]:
@@ -906,74 +1075,71 @@ class PhoneChangeService:
         Raises:
             ValueError: Si la confirmation échoue
         """
+        # Récupérer le token
         try:
-            from .models import VerificationToken
-
-            # Récupérer le token
-            try:
-                token = VerificationToken.objects.get(
-                    token=token_uuid, verification_type="phone_change", is_used=False
-                )
-            except VerificationToken.DoesNotExist:
-                raise ValueError("Token de changement invalide ou expiré")
-
-            # Vérifier le code
-            if not token.verify_code(code):
-                raise ValueError(CODE_VERIFICATION_ERROR)
-
-            # Vérifier que l'utilisateur existe
-            if not token.user:
-                raise ValueError(USER_TOKEN_NOT_FOUND_ERROR)
-
-            # Vérifier que le nouveau numéro n'est pas déjà utilisé
-            if User.objects.filter(phone=token.phone).exists():
-                raise ValueError(
-                    "Ce numéro de téléphone est maintenant utilisé par un autre compte"
-                )
-
-            # Changer le numéro de téléphone
-            old_phone = token.user.phone
-            token.user.phone = token.phone
-            token.user.save(update_fields=["phone"])
-
-            # Marquer le token comme utilisé
-            token.mark_as_used()
-
-            # Envoyer SMS de confirmation sur l'ancien ET le nouveau numéro
-            sms_gateway = get_sms_gateway()
-            try:
-                # Confirmation sur l'ancien numéro
-                sms_gateway.send_confirmation_message(
-                    old_phone,
-                    "phone_change",
-                    f"Votre nouveau numéro est: {token.phone}",
-                )
-                # Confirmation sur le nouveau numéro
-                sms_gateway.send_confirmation_message(
-                    token.phone,
-                    "phone_change",
-                    "Ce numéro est maintenant associé à votre compte WaterBill",
-                )
-            except Exception as e:
-                # Log l'erreur mais ne pas faire échouer l'opération
-                logger.warning(
-                    f"Échec envoi SMS de confirmation pour changement de numéro: {str(e)}"
-                )
-
-            logger.info(
-                f"Numéro changé de {old_phone} vers {token.phone} pour l'utilisateur {token.user.id}"
+            token = VerificationToken.objects.select_related("user").get(
+                token=token_uuid, verification_type="phone_change", is_used=False
             )
+        except VerificationToken.DoesNotExist:
+            # Même coût qu'un code incorrect pour ne pas révéler l'absence du token
+            VerificationToken.verify_code_without_token(code)
+            raise ValueError("Token de changement invalide ou expiré")
+
+        # Vérifier le code
+        if not token.verify_code(code):
+            raise ValueError(CODE_VERIFICATION_ERROR)
+
+        # Vérifier que l'utilisateur existe
+        if not token.user:
+            raise ValueError(USER_TOKEN_NOT_FOUND_ERROR)
+
+        # Changer le numéro de téléphone : la contrainte d'unicité en base
+        # détecte un numéro pris entre-temps, sans requête préalable
+        old_phone = token.user.phone
+        token.user.phone = token.phone
+        try:
+            with transaction.atomic():
+                token.user.save(update_fields=["phone"])
+
+                # Marquer le token comme utilisé
+                token.mark_as_used()
+
+                # Envoyer SMS de confirmation sur l'ancien ET le nouveau
+                # numéro, uniquement une fois la transaction validée
+                confirmations = [
+                    # Confirmation sur l'ancien numéro
+                    (
+                        old_phone,
+                        "phone_change",
+                        f"Votre nouveau numéro est: {token.phone}",
+                    ),
+                    # Confirmation sur le nouveau numéro
+                    (
+                        token.phone,
+                        "phone_change",
+                        "Ce numéro est maintenant associé à votre compte WaterBill",
+                    ),
+                ]
+                transaction.on_commit(
+                    lambda: send_confirmation_batch_in_background(
+                        get_sms_gateway(), confirmations
+                    )
+                )
+        except IntegrityError as e:
+            token.user.phone = old_phone
+            raise ValueError(
+                "Ce numéro de téléphone est maintenant utilisé par un autre compte"
+            ) from e
+
+        logger.info(
+            "Numéro changé de %s vers %s pour l'utilisateur %s",
+            old_phone,
+            token.phone,
+            token.user.id,
+        )
 
-            return {
-                "success": True,
-                "message": "Votre numéro de téléphone a été changé avec succès.",
-                "new_phone": token.phone,
-            }
-
-        except ValueError:
-            raise
-        except Exception as e:
-            logger.error(
-                f"Erreur lors de la confirmation de changement de numéro: {str(e)}"
-            )
-            raise ValueError(f"Erreur lors du changement de numéro: {str(e)}")
+        return {
+            "success": True,
+            "message": "Votre numéro de téléphone a été changé avec succès.",
+            "new_phone": token.phone,
+        }
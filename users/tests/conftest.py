@@ -6,7 +6,6 @@ afin d'éviter les appels réels aux services externes (Twilio, etc.).
 """
 
 import pytest
-from unittest.mock import patch
 from users.tests.mocks import MockSmsGateway
 
 # Constantes pour les chemins de patch
@@ -14,54 +13,67 @@ SMS_GATEWAY_PATH = "users.gateways.sms.get_sms_gateway"
 SMS_SERVICES_PATH = "users.services.get_sms_gateway"
 TWILIO_SMS_GATEWAY_PATH = "users.gateways.sms.TwilioSmsGateway"
 
+# Cibles patchées, remplacées par une fabrique renvoyant le mock
+_SMS_PATCH_TARGETS = (SMS_GATEWAY_PATH, SMS_SERVICES_PATH, TWILIO_SMS_GATEWAY_PATH)
+
+
+def _mock_sms_gateway(
+    monkeypatch, should_succeed: bool = True, error_message: str = None
+) -> MockSmsGateway:
+    """
+    Installe un gateway SMS mocké sur toutes les cibles de patch.
+
+    monkeypatch remplace directement les attributs et les restaure
+    à la fin du test, sans les objets _patch de unittest.mock.
+
+    Args:
+        monkeypatch: Fixture monkeypatch de pytest
+        should_succeed: Si True, simule un envoi réussi
+        error_message: Message d'erreur à lever si should_succeed=False
+
+    Returns:
+        MockSmsGateway: Gateway SMS mocké
+    """
+    mock_sms = MockSmsGateway(
+        should_succeed=should_succeed, error_message=error_message
+    )
+
+    def factory(*args, **kwargs):
+        return mock_sms
+
+    for target in _SMS_PATCH_TARGETS:
+        monkeypatch.setattr(target, factory)
+    return mock_sms
+
 
 @pytest.fixture(autouse=True)
-def mock_external_services():
+def mock_external_services(monkeypatch):
     """
     Fixture automatique qui mock tous les services externes.
 
     Cette fixture s'applique automatiquement à tous les tests
     pour éviter les appels réels à Twilio, etc.
     """
-    mock_sms = MockSmsGateway(should_succeed=True)
-
-    with patch(SMS_GATEWAY_PATH, return_value=mock_sms), patch(
-        SMS_SERVICES_PATH, return_value=mock_sms
-    ), patch(TWILIO_SMS_GATEWAY_PATH) as mock_twilio:
-
-        mock_twilio.return_value = mock_sms
-        yield mock_sms
+    return _mock_sms_gateway(monkeypatch)
 
 
 @pytest.fixture
-def mock_sms_failure():
+def mock_sms_failure(monkeypatch):
     """
     Fixture pour simuler des échecs SMS dans les tests spécifiques.
     """
-    mock_sms = MockSmsGateway(
-        should_succeed=False, error_message="Service SMS indisponible"
+    return _mock_sms_gateway(
+        monkeypatch, should_succeed=False, error_message="Service SMS indisponible"
     )
 
-    with patch(SMS_GATEWAY_PATH, return_value=mock_sms), patch(
-        SMS_SERVICES_PATH, return_value=mock_sms
-    ), patch(TWILIO_SMS_GATEWAY_PATH) as mock_twilio:
-
-        mock_twilio.return_value = mock_sms
-        yield mock_sms
-
 
 @pytest.fixture
-def mock_sms_unavailable():
+def mock_sms_unavailable(monkeypatch):
     """
     Fixture pour simuler un service SMS indisponible.
     """
-    mock_sms = MockSmsGateway(
-        should_succeed=False, error_message="Service SMS temporairement indisponible"
+    return _mock_sms_gateway(
+        monkeypatch,
+        should_succeed=False,
+        error_message="Service SMS temporairement indisponible",
     )
-
-    with patch(SMS_GATEWAY_PATH, return_value=mock_sms), patch(
-        SMS_SERVICES_PATH, return_value=mock_sms
-    ), patch(TWILIO_SMS_GATEWAY_PATH) as mock_twilio:
-
-        mock_twilio.return_value = mock_sms
-        yield mock_sms
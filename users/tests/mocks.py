@@ -5,6 +5,7 @@ Ce module fournit des mocks pour tous les services externes
 utilisés dans l'application (SMS, etc.).
 """
 
+from collections import deque
 from unittest.mock import patch
 
 
@@ -15,6 +16,9 @@ class MockSmsGateway:
     Simule l'envoi de SMS sans faire d'appels réels à Twilio.
     """
 
+    # Nombre maximal de messages conservés pour les vérifications
+    MAX_SENT_MESSAGES = 1000
+
     def __init__(self, should_succeed: bool = True, error_message: str = None):
         """
         Initialise le mock SMS gateway.
@@ -25,7 +29,21 @@ class MockSmsGateway:
         """
         self.should_succeed = should_succeed
         self.error_message = error_message
-        self.sent_messages = []  # Pour vérifier les messages envoyés
+        # Pour vérifier les messages envoyés ; borné pour ne pas croître
+        # indéfiniment sur une longue session de tests
+        self.sent_messages = deque(maxlen=self.MAX_SENT_MESSAGES)
+        # Dernier message envoyé à chaque numéro, pour un accès direct
+        self.by_phone = {}
+
+    def _record(self, message: dict) -> None:
+        """
+        Enregistre un message envoyé dans l'historique et l'index par numéro.
+
+        Args:
+            message: Message simulé (doit contenir la clé "phone")
+        """
+        self.sent_messages.append(message)
+        self.by_phone[message["phone"]] = message
 
     def send_activation_code(self, phone: str, code: str) -> bool:
         """
@@ -39,7 +57,7 @@ class MockSmsGateway:
             bool: True si l'envoi a réussi, False sinon
         """
         # Enregistrer le message envoyé pour les tests
-        self.sent_messages.append(
+        self._record(
             {
                 "phone": phone,
                 "code": code,
@@ -54,6 +72,22 @@ class MockSmsGateway:
 
         return True
 
+    def send_many(self, messages: list) -> list:
+        """
+        Simule l'envoi groupé de codes d'activation.
+
+        Args:
+            messages: Liste de couples (téléphone, code d'activation)
+
+        Returns:
+            list: Numéros dont l'envoi a échoué (vide si tout a réussi)
+        """
+        return [
+            phone
+            for phone, code in messages
+            if not self.send_activation_code(phone, code)
+        ]
+
     def send_verification_code(
         self, phone: str, code: str, operation_type: str, redirect_url: str = None
     ) -> bool:
@@ -70,7 +104,7 @@ class MockSmsGateway:
             bool: True si l'envoi a réussi, False sinon
         """
         # Enregistrer le message envoyé pour les tests
-        self.sent_messages.append(
+        self._record(
             {
                 "phone": phone,
                 "code": code,
@@ -102,7 +136,7 @@ class MockSmsGateway:
             bool: True si l'envoi a réussi, False sinon
         """
         # Enregistrer le message envoyé pour les tests
-        self.sent_messages.append(
+        self._record(
             {
                 "phone": phone,
                 "operation_type": operation_type,
@@ -118,6 +152,22 @@ class MockSmsGateway:
 
         return True
 
+    def send_confirmation_batch(self, messages: list) -> bool:
+        """
+        Simule l'envoi groupé de messages de confirmation.
+
+        Args:
+            messages: Liste de triplets (téléphone, type d'opération, détails)
+
+        Returns:
+            bool: True si tous les envois ont réussi, False sinon
+        """
+        results = [
+            self.send_confirmation_message(phone, operation_type, details)
+            for phone, operation_type, details in messages
+        ]
+        return all(results)
+
     def is_available(self) -> bool:
         """
         Simule la disponibilité du service SMS.
@@ -6,6 +6,9 @@ avec codes SMS, gestion des tentatives et limites de taux.
 """
 
 from datetime import timedelta
+from unittest.mock import patch
+from django.db.models import Exists, OuterRef
+from django.test import SimpleTestCase
 from django.utils import timezone
 from rest_framework import status
 
@@ -14,13 +17,84 @@ from users.services import ActivationService, RateLimitService
 from .test_settings import MockedTestCase, MockedAPITestCase
 from .test_whitelist_base import WhitelistAPITestCase
 
+# Code connu et son hash, calculé une seule fois pour tout le module
+_CODE = "123456"
+_CODE_HASH = ActivationToken.hash_code(_CODE)
+
+
+def _make_token(
+    user: User, delta: timedelta = timedelta(minutes=10), **extra
+) -> ActivationToken:
+    """
+    Crée en un seul INSERT un token d'activation portant le code connu.
+
+    Args:
+        user: Utilisateur du token
+        delta: Durée de validité restante (négative pour un token expiré)
+        **extra: Autres champs du token à fixer
+
+    Returns:
+        ActivationToken: Token créé
+    """
+    now = timezone.now()
+    fields = {
+        "code_hash": _CODE_HASH,
+        "expires_at": now + delta,
+        "last_sent_at": now,
+        **extra,
+    }
+    return ActivationToken.objects.create(user=user, **fields)
+
+
+def _user_is_active(user: User) -> bool:
+    """Relit uniquement le champ is_active de l'utilisateur en base."""
+    return User.objects.filter(pk=user.pk).values_list("is_active", flat=True).get()
+
+
+def _token_field(token: ActivationToken, field: str):
+    """Relit un seul champ du token d'activation en base."""
+    return (
+        ActivationToken.objects.filter(pk=token.pk).values_list(field, flat=True).get()
+    )
+
+
+class ActivationCodeTest(SimpleTestCase):
+    """Tests de génération et de hashage des codes, sans base de données."""
+
+    def test_code_generation(self):
+        """Test de génération de codes d'activation."""
+        code = ActivationToken.generate_code()
+
+        # Chaîne de 6 chiffres entre 100000 et 999999
+        self.assertIsInstance(code, str)
+        self.assertRegex(code, r"^[1-9]\d{5}$")
+
+    def test_code_hashing(self):
+        """Test de hashage des codes d'activation."""
+        code = "123456"
+        hash1 = ActivationToken.hash_code(code)
+        hash2 = ActivationToken.hash_code(code)
+
+        self.assertEqual(hash1, hash2)
+        self.assertEqual(len(hash1), 64)  # SHA256 length
+        self.assertNotEqual(hash1, code)
+
 
 class ActivationTokenModelTest(MockedTestCase):
     """Tests pour le modèle ActivationToken."""
 
-    def setUp(self):
-        """Configuration initiale pour les tests."""
-        self.user = User.objects.create_user(
+    @classmethod
+    def setUpClass(cls):
+        """Fige le code généré : ces tests n'en vérifient pas l'aléa."""
+        super().setUpClass()
+        cls.enterClassContext(
+            patch.object(ActivationToken, "generate_code", return_value=_CODE)
+        )
+
+    @classmethod
+    def setUpTestData(cls):
+        """Données partagées par les tests de la classe."""
+        cls.user = User.objects.create_user(
             phone="670000000",
             first_name="Test",
             last_name="User",
@@ -40,25 +114,6 @@ class ActivationTokenModelTest(MockedTestCase):
         # Vérifier que le code hash est bien généré
         self.assertEqual(len(token.code_hash), 64)  # SHA256 hash length
 
-    def test_code_generation(self):
-        """Test de génération de codes d'activation."""
-        code = ActivationToken.generate_code()
-
-        self.assertEqual(len(str(code)), 6)
-        self.assertTrue(str(code).isdigit())
-        self.assertGreaterEqual(int(code), 100000)
-        self.assertLessEqual(int(code), 999999)
-
-    def test_code_hashing(self):
-        """Test de hashage des codes d'activation."""
-        code = "123456"
-        hash1 = ActivationToken.hash_code(code)
-        hash2 = ActivationToken.hash_code(code)
-
-        self.assertEqual(hash1, hash2)
-        self.assertEqual(len(hash1), 64)  # SHA256 length
-        self.assertNotEqual(hash1, code)
-
     def test_token_expiration(self):
         """Test de vérification d'expiration du token."""
         token = ActivationToken.create_token(self.user)
@@ -87,38 +142,49 @@ class ActivationTokenModelTest(MockedTestCase):
 
     def test_code_verification_success(self):
         """Test de vérification réussie d'un code."""
-        token = ActivationToken.create_token(self.user)
-        original_code = "123456"
-        token.code_hash = ActivationToken.hash_code(original_code)
-        token.save()
+        token = _make_token(self.user)
 
-        result = token.verify_code(original_code)
+        with self.assertNumQueries(0):
+            result = token.verify_code(_CODE)
 
         self.assertTrue(result)
 
     def test_code_verification_failure(self):
         """Test de vérification échouée d'un code."""
-        token = ActivationToken.create_token(self.user)
-        original_code = "123456"
-        token.code_hash = ActivationToken.hash_code(original_code)
-        token.save()
+        token = _make_token(self.user)
 
         result = token.verify_code("654321")
 
         self.assertFalse(result)
         self.assertEqual(token.attempts, 1)
 
+    def test_code_verification_uses_constant_time_comparison(self):
+        """Test que la comparaison du code se fait en temps constant."""
+        token = _make_token(self.user)
+
+        with patch("users.models.hmac.compare_digest", return_value=True) as mock_cmp:
+            result = token.verify_code(_CODE)
+
+        self.assertTrue(result)
+        mock_cmp.assert_called_once()
+
+    def test_code_verification_expired_token_correct_code(self):
+        """Test qu'un bon code sur un token expiré est refusé sans tentative."""
+        token = _make_token(self.user, delta=-timedelta(minutes=1))
+
+        self.assertFalse(token.verify_code(_CODE))
+        self.assertEqual(token.attempts, 0)
+
     def test_user_activation(self):
         """Test d'activation d'un utilisateur."""
-        token = ActivationToken.create_token(self.user)
+        token = _make_token(self.user)
 
         self.assertFalse(self.user.is_active)
 
         token.activate_user()
 
         # Vérifier que l'utilisateur est activé
-        self.user.refresh_from_db()
-        self.assertTrue(self.user.is_active)
+        self.assertTrue(_user_is_active(self.user))
 
         # Vérifier que le token est supprimé
         self.assertFalse(ActivationToken.objects.filter(user=self.user).exists())
@@ -127,10 +193,10 @@ class ActivationTokenModelTest(MockedTestCase):
 class ActivationServiceTest(MockedTestCase):
     """Tests pour le service d'activation."""
 
-    def setUp(self):
-        """Configuration initiale pour les tests."""
-        super().setUp()
-        self.user = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        """Données partagées par les tests de la classe."""
+        cls.user = User.objects.create_user(
             phone="670000000",
             first_name="Test",
             last_name="User",
@@ -140,25 +206,21 @@ class ActivationServiceTest(MockedTestCase):
     def test_create_and_send_activation_code(self):
         """Test de création et envoi d'un code d'activation."""
         # Mock du gateway SMS
-        with self.settings(DEBUG=True):  # Utilise DummySmsGateway
-            code = ActivationService.create_and_send_activation_code(self.user)
+        code = ActivationService.create_and_send_activation_code(self.user)
 
-            self.assertIsNotNone(code)
-            self.assertEqual(len(code), 6)
+        self.assertIsNotNone(code)
+        self.assertEqual(len(code), 6)
 
-            # Vérifier que le token existe
-            token = ActivationToken.objects.get(user=self.user)
-            self.assertIsNotNone(token)
+        # Vérifier que le token existe
+        token = ActivationToken.objects.get(user=self.user)
+        self.assertIsNotNone(token)
 
     def test_verify_activation_code_success(self):
         """Test de vérification réussie d'un code d'activation."""
         # Créer un token avec un code connu
-        token = ActivationToken.create_token(self.user)
-        code = "123456"
-        token.code_hash = ActivationToken.hash_code(code)
-        token.save()
+        _make_token(self.user)
 
-        user = ActivationService.verify_activation_code(self.user.phone, code)
+        user = ActivationService.verify_activation_code(self.user.phone, _CODE)
 
         self.assertEqual(user, self.user)
         self.assertTrue(user.is_active)
@@ -168,10 +230,7 @@ class ActivationServiceTest(MockedTestCase):
 
     def test_verify_activation_code_wrong_code(self):
         """Test de vérification avec un code incorrect."""
-        token = ActivationToken.create_token(self.user)
-        code = "123456"
-        token.code_hash = ActivationToken.hash_code(code)
-        token.save()
+        _make_token(self.user)
 
         with self.assertRaises(ValueError) as context:
             ActivationService.verify_activation_code(self.user.phone, "654321")
@@ -180,14 +239,10 @@ class ActivationServiceTest(MockedTestCase):
 
     def test_verify_activation_code_expired(self):
         """Test de vérification avec un code expiré."""
-        token = ActivationToken.create_token(self.user)
-        code = "123456"
-        token.code_hash = ActivationToken.hash_code(code)
-        token.expires_at = timezone.now() - timedelta(minutes=1)
-        token.save()
+        _make_token(self.user, delta=-timedelta(minutes=1))
 
         with self.assertRaises(ValueError) as context:
-            ActivationService.verify_activation_code(self.user.phone, code)
+            ActivationService.verify_activation_code(self.user.phone, _CODE)
 
         self.assertIn("Le code d'activation a expiré", str(context.exception))
 
@@ -200,35 +255,68 @@ class ActivationServiceTest(MockedTestCase):
 
     def test_resend_activation_code(self):
         """Test de renvoi d'un code d'activation."""
-        token = ActivationToken.create_token(self.user)
-
         # Simuler qu'il y a eu du temps depuis le dernier envoi (plus de 60 secondes)
-        from datetime import timedelta
-
-        token.last_sent_at = timezone.now() - timedelta(seconds=70)
-        token.save(update_fields=["last_sent_at"])
+        token = _make_token(
+            self.user, last_sent_at=timezone.now() - timedelta(seconds=70)
+        )
 
         ActivationService.resend_activation_code(self.user.phone)
 
         # Vérifier que le compteur d'envois est incrémenté
-        token.refresh_from_db()
-        self.assertEqual(token.send_count, 2)
+        send_count, code_hash = (
+            ActivationToken.objects.filter(pk=token.pk)
+            .values_list("send_count", "code_hash")
+            .get()
+        )
+        self.assertEqual(send_count, 2)
+
+        # Le hash stocké correspond au dernier code envoyé
+        self.assertEqual(
+            code_hash,
+            ActivationToken.hash_code(self.mock_sms.sent_messages[-1]["code"]),
+        )
+
+    def test_verify_activation_code_query_count(self):
+        """Test que l'activation tient en trois requêtes."""
+        _make_token(self.user)
+
+        # SELECT utilisateur + token, UPDATE is_active, DELETE du token
+        with self.assertNumQueries(3):
+            ActivationService.verify_activation_code(self.user.phone, _CODE)
+
+    def test_resend_activation_code_query_count(self):
+        """Test que le renvoi avec token existant tient en deux requêtes."""
+        _make_token(self.user, last_sent_at=timezone.now() - timedelta(seconds=70))
+
+        # SELECT utilisateur + token, UPDATE du token
+        with self.assertNumQueries(2):
+            ActivationService.resend_activation_code(self.user.phone)
+
+    def test_resend_activation_code_without_token_query_count(self):
+        """Test que le renvoi sans token tient en trois requêtes."""
+        # SELECT utilisateur + token, DELETE des anciens tokens, INSERT
+        with self.assertNumQueries(3):
+            ActivationService.resend_activation_code(self.user.phone)
 
 
 class ActivationAPITest(MockedAPITestCase, WhitelistAPITestCase):
     """Tests pour les endpoints d'activation."""
 
-    def setUp(self):
-        """Configuration initiale pour les tests."""
-        super().setUp()
-        self.setUp_whitelist()
-        self.user = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        """Données partagées par les tests de la classe."""
+        cls.user = User.objects.create_user(
             phone="670000000",
             first_name="Test",
             last_name="User",
             password="testpass123",
         )
 
+    def setUp(self):
+        """Configuration initiale pour les tests."""
+        super().setUp()
+        self.setUp_whitelist()
+
     def test_register_creates_inactive_user(self):
         """Test que l'inscription crée un utilisateur inactif."""
         # Ajouter le numéro à la liste blanche
@@ -242,28 +330,30 @@ class ActivationAPITest(MockedAPITestCase, WhitelistAPITestCase):
             "password_confirm": "testpass123",
         }
 
-        with self.settings(DEBUG=True):  # Utilise DummySmsGateway
-            response = self.client.post("/api/auth/register/", user_data, format="json")
+        response = self.client.post("/api/auth/register/", user_data, format="json")
 
-            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
-            # Vérifier que l'utilisateur est créé et inactif (format international)
-            user = User.objects.get(phone="+670111111")
-            self.assertFalse(user.is_active)
-
-            # Vérifier qu'un token d'activation existe
-            self.assertTrue(ActivationToken.objects.filter(user=user).exists())
+        # Vérifier en une requête que l'utilisateur est créé et inactif
+        # (format international) et qu'un token d'activation existe
+        row = (
+            User.objects.filter(phone="+670111111")
+            .annotate(
+                has_token=Exists(ActivationToken.objects.filter(user=OuterRef("pk")))
+            )
+            .values("is_active", "has_token")
+            .get()
+        )
+        self.assertFalse(row["is_active"])
+        self.assertTrue(row["has_token"])
 
     def test_activate_user_success(self):
         """Test d'activation réussie d'un utilisateur."""
-        token = ActivationToken.create_token(self.user)
-        code = "123456"
-        token.code_hash = ActivationToken.hash_code(code)
-        token.save()
+        _make_token(self.user)
 
         activation_data = {
             "phone": self.user.phone,
-            "code": code,
+            "code": _CODE,
         }
 
         response = self.client.post(
@@ -273,8 +363,7 @@ class ActivationAPITest(MockedAPITestCase, WhitelistAPITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         # Vérifier que l'utilisateur est activé
-        self.user.refresh_from_db()
-        self.assertTrue(self.user.is_active)
+        self.assertTrue(_user_is_active(self.user))
 
         # Vérifier la réponse
         data = response.json()
@@ -285,7 +374,7 @@ class ActivationAPITest(MockedAPITestCase, WhitelistAPITestCase):
 
     def test_activate_user_wrong_code(self):
         """Test d'activation avec un code incorrect."""
-        ActivationToken.create_token(self.user)
+        _make_token(self.user)
 
         activation_data = {
             "phone": self.user.phone,
@@ -299,33 +388,27 @@ class ActivationAPITest(MockedAPITestCase, WhitelistAPITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
         # Vérifier que l'utilisateur reste inactif
-        self.user.refresh_from_db()
-        self.assertFalse(self.user.is_active)
+        self.assertFalse(_user_is_active(self.user))
 
     def test_resend_code_success(self):
         """Test de renvoi réussi d'un code."""
-        token = ActivationToken.create_token(self.user)
-
         # Simuler qu'il y a eu du temps depuis le dernier envoi (plus de 60 secondes)
-        from datetime import timedelta
-
-        token.last_sent_at = timezone.now() - timedelta(seconds=70)
-        token.save(update_fields=["last_sent_at"])
+        token = _make_token(
+            self.user, last_sent_at=timezone.now() - timedelta(seconds=70)
+        )
 
         resend_data = {
             "phone": self.user.phone,
         }
 
-        with self.settings(DEBUG=True):  # Utilise DummySmsGateway
-            response = self.client.post(
-                "/api/auth/resend-code/", resend_data, format="json"
-            )
+        response = self.client.post(
+            "/api/auth/resend-code/", resend_data, format="json"
+        )
 
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-            # Vérifier que le compteur d'envois est incrémenté
-            token.refresh_from_db()
-            self.assertEqual(token.send_count, 2)
+        # Vérifier que le compteur d'envois est incrémenté
+        self.assertEqual(_token_field(token, "send_count"), 2)
 
     def test_login_inactive_user(self):
         """Test de connexion d'un utilisateur inactif."""
@@ -365,10 +448,10 @@ class ActivationAPITest(MockedAPITestCase, WhitelistAPITestCase):
 class RateLimitServiceTest(MockedTestCase):
     """Tests pour le service de limitation de taux."""
 
-    def setUp(self):
-        """Configuration initiale pour les tests."""
-        super().setUp()
-        self.user = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        """Données partagées par les tests de la classe."""
+        cls.user = User.objects.create_user(
             phone="670000000",
             first_name="Test",
             last_name="User",
@@ -377,13 +460,8 @@ class RateLimitServiceTest(MockedTestCase):
 
     def test_check_activation_limits_with_token(self):
         """Test de vérification des limites avec token existant."""
-        token = ActivationToken.create_token(self.user)
-
         # Simuler qu'il y a eu du temps depuis le dernier envoi (plus de 60 secondes)
-        from datetime import timedelta
-
-        token.last_sent_at = timezone.now() - timedelta(seconds=70)
-        token.save(update_fields=["last_sent_at"])
+        _make_token(self.user, last_sent_at=timezone.now() - timedelta(seconds=70))
 
         limits = RateLimitService.check_activation_limits(self.user.phone)
 
@@ -394,6 +472,25 @@ class RateLimitServiceTest(MockedTestCase):
         self.assertIsNotNone(limits["last_sent"])
         self.assertIsNotNone(limits["expires_at"])
 
+    def test_check_activation_limits_single_query(self):
+        """Test que l'utilisateur et son token sont lus en une seule requête."""
+        _make_token(self.user)
+
+        with self.assertNumQueries(1):
+            RateLimitService.check_activation_limits(self.user.phone)
+
+    def test_check_activation_limits_quota_reset_next_day(self):
+        """Test que le quota journalier est levé le lendemain sans écriture."""
+        _make_token(
+            self.user, send_count=5, last_sent_at=timezone.now() - timedelta(days=1)
+        )
+
+        with self.assertNumQueries(1):
+            limits = RateLimitService.check_activation_limits(self.user.phone)
+
+        self.assertTrue(limits["can_send"])
+        self.assertEqual(limits["send_count"], 0)
+
     def test_check_activation_limits_without_token(self):
         """Test de vérification des limites sans token."""
         limits = RateLimitService.check_activation_limits("670999999")
@@ -2,8 +2,12 @@
 Tests pour vérifier que l'inscription d'utilisateur est atomique.
 """
 
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 
+from django.db import connection
+from django.test import SimpleTestCase
+
+from users.gateways.sms import DummySmsGateway
 from users.models import User, ActivationToken
 from users.services import AuthService, ActivationService
 from .test_settings import MockedTestCase
@@ -15,6 +19,11 @@ class AtomicRegistrationTestCase(MockedTestCase):
     def setUp(self):
         """Configuration des tests."""
         super().setUp()
+        # Un seul patch du gateway SMS par test, configuré dans chaque test
+        self.mock_get_gateway = self.enterContext(
+            patch("users.services.get_sms_gateway")
+        )
+        self.mock_gateway = self.mock_get_gateway.return_value
         self.user_data = {
             "phone": "670123456",
             "first_name": "John",
@@ -27,106 +36,67 @@ class AtomicRegistrationTestCase(MockedTestCase):
     def test_successful_registration_is_atomic(self):
         """Test qu'une inscription réussie crée bien l'utilisateur et le token."""
         # Mock du gateway SMS pour simuler un envoi réussi
-        with patch("users.services.get_sms_gateway") as mock_get_gateway:
-            mock_gateway = MagicMock()
-            mock_gateway.is_available.return_value = True
-            mock_gateway.send_activation_code.return_value = True
-            mock_get_gateway.return_value = mock_gateway
-
-            # Inscription de l'utilisateur
-            user = AuthService.register_user(self.user_data)
-
-            # Vérifications
-            self.assertIsNotNone(user)
-            self.assertEqual(user.phone, "+670123456")
-            self.assertFalse(user.is_active)  # Utilisateur inactif par défaut
-
-            # Vérifier qu'un token d'activation a été créé
-            token = ActivationToken.objects.get(user=user)
-            self.assertIsNotNone(token)
-
-            # Vérifier que le SMS a été envoyé
-            mock_gateway.send_activation_code.assert_called_once()
-
-    def test_sms_failure_rolls_back_user_creation(self):
-        """Test qu'un échec d'envoi SMS annule la création d'utilisateur."""
-        # Mock du gateway SMS pour simuler un échec d'envoi
-        with patch("users.services.get_sms_gateway") as mock_get_gateway:
-            mock_gateway = MagicMock()
-            mock_gateway.is_available.return_value = True
-            mock_gateway.send_activation_code.return_value = False
-            mock_get_gateway.return_value = mock_gateway
-
-            # Vérifier qu'aucun utilisateur n'existe avant
-            initial_count = User.objects.count()
-
-            # Tentative d'inscription qui doit échouer
-            with self.assertRaises(ValueError) as context:
-                AuthService.register_user(self.user_data)
-
-            # Vérifier le message d'erreur
-            self.assertIn(
-                "Erreur lors de l'envoi du code d'activation", str(context.exception)
-            )
-
-            # Vérifier qu'aucun utilisateur n'a été créé
-            final_count = User.objects.count()
-            self.assertEqual(initial_count, final_count)
-
-            # Vérifier qu'aucun token d'activation n'a été créé
-            token_count = ActivationToken.objects.count()
-            self.assertEqual(token_count, 0)
-
-    def test_sms_service_unavailable_rolls_back_user_creation(self):
-        """Test qu'un service SMS indisponible annule la création d'utilisateur."""
-        # Mock du gateway SMS pour simuler un service indisponible
-        with patch("users.services.get_sms_gateway") as mock_get_gateway:
-            mock_gateway = MagicMock()
-            mock_gateway.is_available.return_value = False
-            mock_get_gateway.return_value = mock_gateway
-
-            # Vérifier qu'aucun utilisateur n'existe avant
-            initial_count = User.objects.count()
-
-            # Tentative d'inscription qui doit échouer
-            with self.assertRaises(ValueError) as context:
-                AuthService.register_user(self.user_data)
-
-            # Vérifier le message d'erreur
-            self.assertIn(
-                "Service SMS temporairement indisponible", str(context.exception)
-            )
-
-            # Vérifier qu'aucun utilisateur n'a été créé
-            final_count = User.objects.count()
-            self.assertEqual(initial_count, final_count)
-
-    def test_sms_exception_rolls_back_user_creation(self):
-        """Test qu'une exception SMS annule la création d'utilisateur."""
-        # Mock du gateway SMS pour simuler une exception
-        with patch("users.services.get_sms_gateway") as mock_get_gateway:
-            mock_gateway = MagicMock()
-            mock_gateway.is_available.return_value = True
-            mock_gateway.send_activation_code.side_effect = Exception(
-                "Erreur réseau SMS"
-            )
-            mock_get_gateway.return_value = mock_gateway
-
-            # Vérifier qu'aucun utilisateur n'existe avant
-            initial_count = User.objects.count()
-
-            # Tentative d'inscription qui doit échouer
-            with self.assertRaises(ValueError) as context:
-                AuthService.register_user(self.user_data)
-
-            # Vérifier le message d'erreur
-            self.assertIn(
-                "Erreur lors de l'envoi du code d'activation", str(context.exception)
-            )
-
-            # Vérifier qu'aucun utilisateur n'a été créé
-            final_count = User.objects.count()
-            self.assertEqual(initial_count, final_count)
+        self.mock_gateway.send_activation_code.return_value = True
+
+        # Inscription de l'utilisateur
+        user = AuthService.register_user(self.user_data)
+
+        # Vérifications
+        self.assertIsNotNone(user)
+        self.assertEqual(user.phone, "+670123456")
+        self.assertFalse(user.is_active)  # Utilisateur inactif par défaut
+
+        # Vérifier qu'un token d'activation a été créé
+        token = ActivationToken.objects.get(user=user)
+        self.assertIsNotNone(token)
+
+        # Vérifier que le SMS a été envoyé
+        self.mock_gateway.send_activation_code.assert_called_once()
+
+    def test_sms_errors_roll_back_user_creation(self):
+        """Test que toute erreur d'envoi SMS annule la création d'utilisateur."""
+        network_error = ConnectionError("Connexion refusée")
+        sms_error = Exception("Erreur réseau SMS")
+        cases = [
+            (
+                "echec_envoi",
+                {"send_activation_code.return_value": False},
+                "Échec de l'envoi du SMS",
+                None,
+            ),
+            (
+                "indisponible",
+                {"send_activation_code.side_effect": network_error},
+                "Service SMS temporairement indisponible",
+                network_error,
+            ),
+            (
+                "exception",
+                {"send_activation_code.side_effect": sms_error},
+                "Erreur lors de l'envoi du code d'activation",
+                sms_error,
+            ),
+        ]
+
+        for name, gateway_config, message, cause in cases:
+            with self.subTest(name):
+                self.mock_gateway.reset_mock(return_value=True, side_effect=True)
+                self.mock_gateway.configure_mock(**gateway_config)
+
+                # Tentative d'inscription qui doit échouer
+                with self.assertRaises(ValueError) as context:
+                    AuthService.register_user(self.user_data)
+
+                # Vérifier le message d'erreur et l'exception d'origine chaînée
+                self.assertIn(message, str(context.exception))
+                self.assertIs(context.exception.__cause__, cause)
+
+                # Aucune sonde de disponibilité avant l'envoi
+                self.mock_gateway.is_available.assert_not_called()
+
+                # Vérifier qu'aucun utilisateur ni token n'a été créé
+                self.assertFalse(User.objects.filter(phone="+670123456").exists())
+                self.assertFalse(ActivationToken.objects.exists())
 
     def test_duplicate_phone_rolls_back_everything(self):
         """Test qu'un téléphone dupliqué annule toute l'opération."""
@@ -138,90 +108,44 @@ class AtomicRegistrationTestCase(MockedTestCase):
             password="password123",
         )
 
-        # Mock du gateway SMS (ne devrait même pas être appelé)
-        with patch("users.services.get_sms_gateway") as mock_get_gateway:
-            mock_gateway = MagicMock()
-            mock_get_gateway.return_value = mock_gateway
-
-            # Tentative d'inscription avec le même téléphone
-            with self.assertRaises(Exception):
-                AuthService.register_user(self.user_data)
+        # Tentative d'inscription avec le même téléphone (le gateway SMS
+        # ne devrait même pas être appelé)
+        with self.assertRaises(Exception):
+            AuthService.register_user(self.user_data)
 
-            # Vérifier que le SMS n'a pas été envoyé
-            mock_gateway.send_activation_code.assert_not_called()
+        # Vérifier que le SMS n'a pas été envoyé
+        self.mock_gateway.send_activation_code.assert_not_called()
 
-            # Vérifier qu'un seul utilisateur existe (l'original)
-            user_count = User.objects.count()
-            self.assertEqual(user_count, 1)
-            self.assertEqual(User.objects.first(), existing_user)
+        # Vérifier qu'un seul utilisateur existe (l'original)
+        user_count = User.objects.count()
+        self.assertEqual(user_count, 1)
+        self.assertEqual(User.objects.first(), existing_user)
 
     def test_transaction_isolation(self):
         """Test que les transactions sont bien isolées."""
-        # Mock du gateway SMS pour le premier utilisateur (succès)
-        with patch("users.services.get_sms_gateway") as mock_get_gateway:
-            mock_gateway = MagicMock()
-            mock_gateway.is_available.return_value = True
-            mock_gateway.send_activation_code.return_value = True
-            mock_get_gateway.return_value = mock_gateway
+        # Premier envoi réussi, second en échec
+        self.mock_gateway.send_activation_code.side_effect = [True, False]
 
-            # Créer le premier utilisateur
-            user1 = AuthService.register_user(self.user_data)
+        # Créer le premier utilisateur
+        user1 = AuthService.register_user(self.user_data)
 
-            # Vérifier qu'il existe
-            self.assertIsNotNone(user1)
-            self.assertTrue(User.objects.filter(phone="+670123456").exists())
+        # Vérifier qu'il existe
+        self.assertIsNotNone(user1)
+        self.assertTrue(User.objects.filter(phone="+670123456").exists())
 
-        # Mock du gateway SMS pour le deuxième utilisateur (échec)
         user_data2 = self.user_data.copy()
         user_data2["phone"] = "670654321"
         user_data2["email"] = "user2@example.com"
 
-        with patch("users.services.get_sms_gateway") as mock_get_gateway:
-            mock_gateway = MagicMock()
-            mock_gateway.is_available.return_value = True
-            mock_gateway.send_activation_code.return_value = False
-            mock_get_gateway.return_value = mock_gateway
-
-            # Tentative de création du deuxième utilisateur (doit échouer)
-            with self.assertRaises(ValueError):
-                AuthService.register_user(user_data2)
-
-            # Vérifier que seul le premier utilisateur existe
-            user_count = User.objects.count()
-            self.assertEqual(user_count, 1)
-            self.assertTrue(User.objects.filter(phone="+670123456").exists())
-            self.assertFalse(User.objects.filter(phone="670654321").exists())
-
-    def test_activation_service_is_atomic(self):
-        """Test que le service d'activation est atomique."""
-        # Créer un utilisateur sans token d'activation
-        user = User.objects.create_user(
-            phone="670999888",
-            first_name="Test",
-            last_name="User",
-            password="password123",
-        )
-
-        # Mock du gateway SMS pour simuler un échec
-        with patch("users.services.get_sms_gateway") as mock_get_gateway:
-            mock_gateway = MagicMock()
-            mock_gateway.is_available.return_value = True
-            mock_gateway.send_activation_code.return_value = False
-            mock_get_gateway.return_value = mock_gateway
-
-            # Vérifier qu'aucun token n'existe avant
-            initial_token_count = ActivationToken.objects.count()
+        # Tentative de création du deuxième utilisateur (doit échouer)
+        with self.assertRaises(ValueError):
+            AuthService.register_user(user_data2)
 
-            # Tentative d'envoi de code d'activation qui doit échouer
-            with self.assertRaises(ValueError) as context:
-                ActivationService.create_and_send_activation_code(user)
-
-            # Vérifier le message d'erreur
-            self.assertIn("Échec de l'envoi du SMS", str(context.exception))
-
-            # Vérifier qu'aucun token n'a été créé
-            final_token_count = ActivationToken.objects.count()
-            self.assertEqual(initial_token_count, final_token_count)
+        # Vérifier que seul le premier utilisateur existe
+        user_count = User.objects.count()
+        self.assertEqual(user_count, 1)
+        self.assertTrue(User.objects.filter(phone="+670123456").exists())
+        self.assertFalse(User.objects.filter(phone="+670654321").exists())
 
     def test_activation_service_success_creates_token(self):
         """Test qu'un envoi SMS réussi crée bien le token."""
@@ -234,24 +158,187 @@ class AtomicRegistrationTestCase(MockedTestCase):
         )
 
         # Mock du gateway SMS pour simuler un succès
-        with patch("users.services.get_sms_gateway") as mock_get_gateway:
-            mock_gateway = MagicMock()
-            mock_gateway.is_available.return_value = True
-            mock_gateway.send_activation_code.return_value = True
-            mock_get_gateway.return_value = mock_gateway
+        self.mock_gateway.send_activation_code.return_value = True
+
+        # Vérifier qu'aucun token n'existe avant
+        initial_token_count = ActivationToken.objects.count()
+
+        # Envoi de code d'activation qui doit réussir
+        code = ActivationService.create_and_send_activation_code(user)
+
+        # Vérifier qu'un token a été créé
+        final_token_count = ActivationToken.objects.count()
+        self.assertEqual(final_token_count, initial_token_count + 1)
+
+        # Vérifier que le token existe et est lié à l'utilisateur
+        token = ActivationToken.objects.get(user=user)
+        self.assertIsNotNone(token)
+        self.assertIsNotNone(code)
+        self.assertEqual(len(code), 6)  # Code à 6 chiffres
+
+    def test_batch_activation_creates_all_tokens(self):
+        """Test qu'un envoi groupé réussi crée un token par utilisateur."""
+        users = [
+            User.objects.create_user(
+                phone=f"67011122{i}",
+                first_name="Batch",
+                last_name=f"User{i}",
+                password="password123",
+            )
+            for i in range(3)
+        ]
 
-            # Vérifier qu'aucun token n'existe avant
-            initial_token_count = ActivationToken.objects.count()
+        self.mock_gateway.send_many.return_value = []
 
-            # Envoi de code d'activation qui doit réussir
-            code = ActivationService.create_and_send_activation_code(user)
+        codes, failed_users = ActivationService.create_and_send_activation_codes(users)
 
-            # Vérifier qu'un token a été créé
-            final_token_count = ActivationToken.objects.count()
-            self.assertEqual(final_token_count, initial_token_count + 1)
+        self.assertEqual(failed_users, [])
 
-            # Vérifier que le token existe et est lié à l'utilisateur
+        # Un seul appel au gateway pour tous les utilisateurs
+        self.mock_gateway.send_many.assert_called_once_with(
+            [(user.phone, code) for user, code in zip(users, codes)]
+        )
+        self.mock_gateway.send_activation_code.assert_not_called()
+
+        # Chaque utilisateur a un token correspondant à son code
+        for user, code in zip(users, codes):
             token = ActivationToken.objects.get(user=user)
-            self.assertIsNotNone(token)
-            self.assertIsNotNone(code)
-            self.assertEqual(len(code), 6)  # Code à 6 chiffres
+            self.assertTrue(token.verify_code(code))
+
+    def test_batch_activation_reports_failed_users(self):
+        """Test qu'un échec d'envoi partiel est signalé par utilisateur."""
+        users = [
+            User.objects.create_user(
+                phone=f"67033344{i}",
+                first_name="Batch",
+                last_name=f"User{i}",
+                password="password123",
+            )
+            for i in range(2)
+        ]
+
+        self.mock_gateway.send_many.return_value = [users[1].phone]
+
+        codes, failed_users = ActivationService.create_and_send_activation_codes(users)
+
+        self.assertEqual(failed_users, [users[1]])
+        # Les tokens sont validés avant l'envoi : un renvoi reste possible
+        for user, code in zip(users, codes):
+            token = ActivationToken.objects.get(user=user)
+            self.assertTrue(token.verify_code(code))
+
+    def test_batch_activation_send_error_does_not_stop_batch(self):
+        """Test qu'une exception d'envoi au milieu du lot n'arrête pas le lot."""
+        users = [
+            User.objects.create_user(
+                phone=f"67044455{i}",
+                first_name="Batch",
+                last_name=f"User{i}",
+                password="password123",
+            )
+            for i in range(3)
+        ]
+
+        # Implémentation par défaut de send_many, avec un envoi qui lève
+        gateway = DummySmsGateway()
+        self.mock_get_gateway.return_value = gateway
+
+        with patch.object(
+            gateway,
+            "send_activation_code",
+            side_effect=[True, OSError("connexion perdue"), True],
+        ) as mock_send:
+            codes, failed_users = ActivationService.create_and_send_activation_codes(
+                users
+            )
+
+        # Tous les codes sont tentés, seul l'utilisateur en échec est signalé
+        self.assertEqual(mock_send.call_count, len(users))
+        self.assertEqual(failed_users, [users[1]])
+        self.assertEqual(len(codes), len(users))
+
+    def test_batch_activation_sends_after_tokens_are_committed(self):
+        """Test que le gateway n'est appelé qu'une fois les tokens validés."""
+        users = [
+            User.objects.create_user(
+                phone=f"67055566{i}",
+                first_name="Batch",
+                last_name=f"User{i}",
+                password="password123",
+            )
+            for i in range(2)
+        ]
+
+        # Profondeur des blocs atomiques de l'appelant (celui du TestCase)
+        caller_depth = len(connection.atomic_blocks)
+
+        def send_many(messages):
+            # Le bloc atomique des tokens est refermé avant l'appel réseau
+            self.assertEqual(len(connection.atomic_blocks), caller_depth)
+            self.assertEqual(
+                ActivationToken.objects.filter(user__in=users).count(), len(users)
+            )
+            return []
+
+        self.mock_gateway.send_many.side_effect = send_many
+
+        ActivationService.create_and_send_activation_codes(users)
+
+        self.mock_gateway.send_many.assert_called_once()
+
+    def test_batch_activation_gateway_unavailable(self):
+        """Test qu'un gateway injoignable est signalé par une ValueError."""
+        users = [
+            User.objects.create_user(
+                phone="670777888",
+                first_name="Batch",
+                last_name="User",
+                password="password123",
+            )
+        ]
+
+        self.mock_gateway.send_many.side_effect = OSError("connexion refusée")
+
+        with self.assertRaises(ValueError) as context:
+            ActivationService.create_and_send_activation_codes(users)
+
+        self.assertIn("temporairement indisponible", str(context.exception))
+
+
+class ActivationSendFailureTestCase(SimpleTestCase):
+    """
+    Échecs d'envoi du code d'activation, sans base de données.
+
+    create_and_send_activation_code envoie le SMS avant toute écriture :
+    SimpleTestCase refuse toute requête SQL, ce qui vérifie en plus
+    qu'un échec d'envoi ne touche jamais la base.
+    """
+
+    def setUp(self):
+        """Configuration des tests."""
+        super().setUp()
+        self.mock_gateway = self.enterContext(
+            patch("users.services.get_sms_gateway")
+        ).return_value
+        # Utilisateur non enregistré : aucun accès base nécessaire
+        self.user = User(phone="+670999888", first_name="Test", last_name="User")
+
+    def test_activation_service_is_atomic(self):
+        """Test qu'un échec d'envoi ne crée aucun token."""
+        self.mock_gateway.send_activation_code.return_value = False
+
+        with self.assertRaises(ValueError) as context:
+            ActivationService.create_and_send_activation_code(self.user)
+
+        self.assertIn("Échec de l'envoi du SMS", str(context.exception))
+
+    def test_activation_service_unavailable_gateway(self):
+        """Test qu'un gateway injoignable est signalé comme indisponible."""
+        self.mock_gateway.send_activation_code.side_effect = ConnectionError(
+            "Connexion refusée"
+        )
+
+        with self.assertRaises(ValueError) as context:
+            ActivationService.create_and_send_activation_code(self.user)
+
+        self.assertIn("Service SMS temporairement indisponible", str(context.exception))
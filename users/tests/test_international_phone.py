@@ -2,254 +2,300 @@
 Tests pour vérifier que les numéros de téléphone sont au format international.
 """
 
-import time
+import itertools
+from datetime import timedelta
+from operator import itemgetter
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 
+from users.models import ActivationToken
+from users.tests.mocks import MockSmsGateway
 from users.utils.phone_utils import normalize_phone
 from .test_whitelist_base import WhitelistAPITestCase
 
 User = get_user_model()
 
+# Identifiants uniques à 6 chiffres pour les mots de passe et e-mails de test
+_unique_ids = itertools.count(100000)
 
+# Pile de middlewares réduite : ces tests d'API authentifiés par JWT
+# n'exercent ni CORS, ni les sessions, ni CSRF, ni les messages
+_API_TEST_MIDDLEWARE = ["django.middleware.common.CommonMiddleware"]
+
+# Contenu de l'enveloppe « data » des réponses de l'API
+_payload = itemgetter("data")
+
+# Numéros inscrits une seule fois en liste blanche pour toute la classe
+_WHITELIST_POOL = tuple(f"675799{i}" for i in range(800, 810))
+
+# Code d'activation et son empreinte, calculée une seule fois
+_CODE = "123456"
+_CODE_HASH = ActivationToken.hash_code(_CODE)
+
+# Requêtes d'une inscription réussie : 3 validations du numéro
+# (UniqueValidator, unicité normalisée, liste blanche), SAVEPOINT, unicité
+# du gestionnaire, INSERT utilisateur, DELETE et INSERT du token, RELEASE
+# SAVEPOINT
+_REGISTER_QUERIES = 9
+
+# Mot de passe haché une seule fois pour tout le module
+_PASSWORD = "TestPass123!"
+_PASSWORD_HASH = make_password(_PASSWORD)
+
+
+def _create_user(phone: str, is_active: bool):
+    """
+    Crée un utilisateur de test sans re-hacher le mot de passe.
+
+    Args:
+        phone: Numéro de téléphone au format international
+        is_active: Statut d'activation du compte
+
+    Returns:
+        User: Utilisateur créé
+    """
+    return User.objects.create(
+        phone=phone,
+        first_name="Test",
+        last_name="User",
+        password=_PASSWORD_HASH,
+        is_active=is_active,
+    )
+
+
+@override_settings(MIDDLEWARE=_API_TEST_MIDDLEWARE)
 class InternationalPhoneTestCase(APITestCase, WhitelistAPITestCase):
     """Tests pour vérifier le format international des numéros de téléphone."""
 
+    @classmethod
+    def setUpTestData(cls):
+        """Crée l'administrateur et la liste blanche partagés par la classe."""
+        cls.admin_user = User.objects.create_user(
+            phone="+237670000000",
+            first_name="Test",
+            last_name="Admin",
+            password="adminpassword123",
+            is_staff=True,
+        )
+        cls.add_phones_to_whitelist(
+            ((phone, "Numéro de test international") for phone in _WHITELIST_POOL),
+            cls.admin_user,
+        )
+
     def setUp(self):
         """Configuration des tests."""
-        self.setUp_whitelist()
+        # Gateway SMS factice (envoi réussi), sans le coût d'un MagicMock
+        self.mock_gateway = MockSmsGateway()
+        self.enterContext(
+            patch("users.services.get_sms_gateway", return_value=self.mock_gateway)
+        )
+
         self.register_url = "/api/auth/register/"
         self.login_url = "/api/auth/login/"
         self.activate_url = "/api/auth/activate/"
         self.resend_url = "/api/auth/resend-code/"
 
-    def tearDown(self):
-        """Nettoyage après chaque test."""
-        # Supprimer tous les utilisateurs créés pendant les tests
-        User.objects.all().delete()
-
     def test_register_with_international_phone_format(self):
         """Test que l'inscription formate le numéro au format international."""
-        # Mock du gateway SMS pour simuler un succès
-        with patch("users.services.get_sms_gateway") as mock_get_gateway:
-            mock_gateway = MagicMock()
-            mock_gateway.is_available.return_value = True
-            mock_gateway.send_activation_code.return_value = True
-            mock_get_gateway.return_value = mock_gateway
-
-            # Données avec numéro sans préfixe + (unique avec timestamp)
-            # 6 derniers chiffres du timestamp
-            unique_suffix = str(int(time.time() * 1000))[-6:]
-            phone_number = f"675799{unique_suffix}"
-
-            # Ajouter le numéro à la liste blanche
-            self.add_phone_to_whitelist(
-                phone_number, f"Numéro de test international {unique_suffix}"
-            )
-
-            data = {
-                "phone": phone_number,  # Sans le + - numéro unique
-                "first_name": "John",
-                "last_name": "Doe",
-                "password": f"TestPass{unique_suffix}!",
-                "password_confirm": f"TestPass{unique_suffix}!",
-                "email": f"john{unique_suffix}@example.com",
-            }
-
-            # Envoyer la requête
+        # Données avec numéro sans préfixe + (déjà en liste blanche)
+        unique_suffix = str(next(_unique_ids))
+        phone_number = "675799805"
+
+        data = {
+            "phone": phone_number,  # Sans le +
+            "first_name": "John",
+            "last_name": "Doe",
+            "password": f"TestPass{unique_suffix}!",
+            "password_confirm": f"TestPass{unique_suffix}!",
+            "email": f"john{unique_suffix}@example.com",
+        }
+
+        # Envoyer la requête
+        with self.assertNumQueries(_REGISTER_QUERIES):
             response = self.client.post(self.register_url, data, format="json")
 
-            # Vérifier que la requête a réussi
-            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # Vérifier que la requête a réussi
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
-            # Vérifier que l'utilisateur a été créé avec le format international
-            user = User.objects.get(first_name="John")
-            self.assertEqual(user.phone, f"+{phone_number}")  # Avec le +
+        # Vérifier que l'utilisateur a été créé avec le format international
+        # (recherche sur l'index unique du téléphone)
+        expected_phone = f"+{phone_number}"
+        self.assertEqual(_payload(response.data)["phone"], expected_phone)
+        self.assertTrue(User.objects.filter(phone=expected_phone).exists())
 
     def test_register_with_plus_prefix(self):
         """Test que l'inscription fonctionne même avec le préfixe +."""
-        # Mock du gateway SMS pour simuler un succès
-        with patch("users.services.get_sms_gateway") as mock_get_gateway:
-            mock_gateway = MagicMock()
-            mock_gateway.is_available.return_value = True
-            mock_gateway.send_activation_code.return_value = True
-            mock_get_gateway.return_value = mock_gateway
-
-            # Données avec numéro avec préfixe + (unique avec timestamp)
-            # 6 derniers chiffres du timestamp
-            unique_suffix = str(int(time.time() * 1000))[-6:]
-            phone_number = f"675799{unique_suffix}"
-
-            # Ajouter le numéro à la liste blanche (sans le +)
-            self.add_phone_to_whitelist(
-                phone_number, f"Numéro de test plus {unique_suffix}"
-            )
-
-            data = {
-                "phone": f"+{phone_number}",  # Avec le + - numéro unique
-                "first_name": "Jane",
-                "last_name": "Doe",
-                "password": f"TestPass{unique_suffix}!",
-                "password_confirm": f"TestPass{unique_suffix}!",
-                "email": f"jane{unique_suffix}@example.com",
-            }
-
-            # Envoyer la requête
+        # Données avec numéro avec préfixe + (déjà en liste blanche)
+        unique_suffix = str(next(_unique_ids))
+        phone_number = "675799806"
+
+        data = {
+            "phone": f"+{phone_number}",  # Avec le +
+            "first_name": "Jane",
+            "last_name": "Doe",
+            "password": f"TestPass{unique_suffix}!",
+            "password_confirm": f"TestPass{unique_suffix}!",
+            "email": f"jane{unique_suffix}@example.com",
+        }
+
+        # Envoyer la requête
+        with self.assertNumQueries(_REGISTER_QUERIES):
             response = self.client.post(self.register_url, data, format="json")
 
-            # Vérifier que la requête a réussi
-            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # Vérifier que la requête a réussi
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
-            # Vérifier que l'utilisateur a été créé avec le format international
-            user = User.objects.get(first_name="Jane")
-            self.assertEqual(user.phone, f"+{phone_number}")
+        # Vérifier que l'utilisateur a été créé avec le format international
+        # (recherche sur l'index unique du téléphone)
+        expected_phone = f"+{phone_number}"
+        self.assertEqual(_payload(response.data)["phone"], expected_phone)
+        self.assertTrue(User.objects.filter(phone=expected_phone).exists())
 
     def test_login_with_international_phone_format(self):
         """Test que la connexion fonctionne avec le format international."""
         # Créer un utilisateur avec format international
-        User.objects.create_user(
-            phone="+675799745",
-            first_name="Test",
-            last_name="User",
-            password="TestPass123!",
-            is_active=True,
-        )
+        _create_user("+675799745", is_active=True)
 
         # Données de connexion avec numéro sans préfixe +
-        data = {"phone": "675799745", "password": "TestPass123!"}  # Sans le +
+        data = {"phone": "675799745", "password": _PASSWORD}  # Sans le +
 
         # Envoyer la requête de connexion
         response = self.client.post(self.login_url, data, format="json")
 
         # Vérifier que la connexion a réussi
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertIn("access", response.data["data"]["tokens"])
+        self.assertIn("access", _payload(response.data)["tokens"])
 
     def test_activate_with_international_phone_format(self):
         """Test que l'activation fonctionne avec le format international."""
         # Créer un utilisateur inactif avec format international
-        user = User.objects.create_user(
-            phone="+675799746",
-            first_name="Test",
-            last_name="User",
-            password="TestPass123!",
-            is_active=False,
-        )
-
-        # Mock du gateway SMS pour simuler un envoi réussi
-        with patch("users.services.get_sms_gateway") as mock_get_gateway:
-            mock_gateway = MagicMock()
-            mock_gateway.is_available.return_value = True
-            mock_gateway.send_activation_code.return_value = True
-            mock_get_gateway.return_value = mock_gateway
+        user = _create_user("+675799746", is_active=False)
 
-            # Créer un token d'activation
-            from users.models import ActivationToken
+        # Créer un token d'activation
+        token = ActivationToken.create_token(user)
+        token.code_hash = _CODE_HASH
+        token.save()
 
-            token = ActivationToken.create_token(user)
-            code = "123456"
-            token.code_hash = ActivationToken.hash_code(code)
-            token.save()
+        # Données d'activation avec numéro sans préfixe +
+        data = {"phone": "675799746", "code": _CODE}  # Sans le +
 
-            # Données d'activation avec numéro sans préfixe +
-            data = {"phone": "675799746", "code": "123456"}  # Sans le +
+        # Envoyer la requête d'activation
+        response = self.client.post(self.activate_url, data, format="json")
 
-            # Envoyer la requête d'activation
-            response = self.client.post(self.activate_url, data, format="json")
-
-            # Vérifier que l'activation a réussi
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
-            # Vérifier que l'utilisateur est activé (pas de tokens lors de l'activation)
-            self.assertTrue(response.data["data"]["user"]["is_active"])
+        # Vérifier que l'activation a réussi
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Vérifier que l'utilisateur est activé (pas de tokens lors de l'activation)
+        self.assertTrue(_payload(response.data)["user"]["is_active"])
 
     def test_resend_code_with_international_phone_format(self):
         """Test que le renvoi de code fonctionne avec le format international."""
         # Créer un utilisateur inactif avec format international
-        user = User.objects.create_user(
-            phone="+675799747",
-            first_name="Test",
-            last_name="User",
-            password="TestPass123!",
-            is_active=False,
-        )
+        user = _create_user("+675799747", is_active=False)
+
+        # Créer un token d'activation
+        token = ActivationToken.create_token(user)
 
-        # Mock du gateway SMS pour simuler un envoi réussi
-        with patch("users.services.get_sms_gateway") as mock_get_gateway:
-            mock_gateway = MagicMock()
-            mock_gateway.is_available.return_value = True
-            mock_gateway.send_activation_code.return_value = True
-            mock_get_gateway.return_value = mock_gateway
-
-            # Créer un token d'activation
-            from users.models import ActivationToken
-            from django.utils import timezone
-            from datetime import timedelta
-
-            token = ActivationToken.create_token(user)
-
-            # Simuler qu'il y a eu du temps depuis le dernier envoi (plus de 60 secondes)
-            token.last_sent_at = timezone.now() - timedelta(seconds=70)
-            token.save(update_fields=["last_sent_at"])
-
-            # Données de renvoi avec numéro sans préfixe +
-            data = {"phone": "675799747"}  # Sans le +
-
-            # Envoyer la requête de renvoi
-            response = self.client.post(self.resend_url, data, format="json")
-
-            # Vérifier que le renvoi a réussi
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
-
-    def test_phone_validation_accepts_various_formats(self):
-        """Test que la validation accepte différents formats de numéros."""
-        # Mock du gateway SMS pour simuler un succès
-        with patch("users.services.get_sms_gateway") as mock_get_gateway:
-            mock_gateway = MagicMock()
-            mock_gateway.is_available.return_value = True
-            mock_gateway.send_activation_code.return_value = True
-            mock_get_gateway.return_value = mock_gateway
-
-            # Générer des numéros uniques avec timestamp
-            base_timestamp = int(time.time() * 1000)
-            test_cases = [
-                f"{675799800 + base_timestamp % 10000}",  # Format simple
-                f"+{675799801 + base_timestamp % 10000}",  # Avec préfixe +
-                # Avec espaces
-                f"675 {799 + base_timestamp % 100} {802 + base_timestamp % 100}",
-                # Avec tirets
-                f"675-{799 + base_timestamp % 100}-{803 + base_timestamp % 100}",
-                # Avec parenthèses
-                f"(675) {799 + base_timestamp % 100}-{804 + base_timestamp % 100}",
-            ]
-
-            for i, phone in enumerate(test_cases):
-                with self.subTest(phone=phone):
-                    unique_id = base_timestamp + i
-
-                    # Ajouter le numéro à la liste blanche
-                    self.add_phone_to_whitelist(
-                        phone, f"Numéro de test format {unique_id}"
-                    )
-
-                    data = {
-                        "phone": phone,
-                        "first_name": f"Test{unique_id}",
-                        "last_name": "User",
-                        "password": f"TestPass{unique_id}!",
-                        "password_confirm": f"TestPass{unique_id}!",
-                        "email": f"test{unique_id}@example.com",
-                    }
-
-                    # Envoyer la requête
-                    response = self.client.post(self.register_url, data, format="json")
-
-                    # Vérifier que la requête a réussi
-                    self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-
-                    # Vérifier que l'utilisateur a été créé avec le format international
-                    # Utiliser l'utilitaire pour normaliser
-                    expected_phone = normalize_phone(phone)
-                    user = User.objects.get(first_name=f"Test{unique_id}")
-                    self.assertEqual(user.phone, expected_phone)
+        # Simuler qu'il y a eu du temps depuis le dernier envoi (plus de 60 secondes)
+        token.last_sent_at = timezone.now() - timedelta(seconds=70)
+        token.save(update_fields=["last_sent_at"])
+
+        # Données de renvoi avec numéro sans préfixe +
+        data = {"phone": "675799747"}  # Sans le +
+
+        # Envoyer la requête de renvoi
+        response = self.client.post(self.resend_url, data, format="json")
+
+        # Vérifier que le renvoi a réussi
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @staticmethod
+    def _registration_data(phone: str) -> dict:
+        """
+        Construit des données d'inscription uniques pour le numéro donné.
+
+        Args:
+            phone: Numéro du pool en liste blanche, dans le format à tester
+
+        Returns:
+            dict: Données d'inscription
+        """
+        unique_id = next(_unique_ids)
+
+        return {
+            "phone": phone,
+            "first_name": f"Test{unique_id}",
+            "last_name": "User",
+            "password": f"TestPass{unique_id}!",
+            "password_confirm": f"TestPass{unique_id}!",
+            "email": f"test{unique_id}@example.com",
+        }
+
+    def _assert_registration_accepts(self, phone: str) -> None:
+        """
+        Inscrit un utilisateur avec le numéro donné et vérifie sa normalisation.
+
+        Args:
+            phone: Numéro du pool en liste blanche, dans le format à tester
+        """
+        data = self._registration_data(phone)
+
+        # Envoyer la requête
+        with self.assertNumQueries(_REGISTER_QUERIES):
+            response = self.client.post(self.register_url, data, format="json")
+
+        # Vérifier que la requête a réussi
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # Vérifier que l'utilisateur a été créé avec le format international
+        expected_phone = normalize_phone(phone)
+        self.assertEqual(_payload(response.data)["phone"], expected_phone)
+        self.assertTrue(User.objects.filter(phone=expected_phone).exists())
+
+    def test_phone_validation_accepts_plain_format(self):
+        """Test que la validation accepte un numéro simple."""
+        self._assert_registration_accepts("675799800")
+
+    def test_phone_validation_accepts_plus_prefix(self):
+        """Test que la validation accepte un numéro avec préfixe +."""
+        self._assert_registration_accepts("+675799801")
+
+    def test_phone_validation_accepts_spaces(self):
+        """Test que la validation accepte un numéro avec espaces."""
+        self._assert_registration_accepts("675 799 802")
+
+    def test_phone_validation_accepts_dashes(self):
+        """Test que la validation accepte un numéro avec tirets."""
+        self._assert_registration_accepts("675-799-803")
+
+    def test_phone_validation_accepts_parentheses(self):
+        """Test que la validation accepte un numéro avec parenthèses."""
+        self._assert_registration_accepts("(675) 799-804")
+
+    def test_register_query_count_independent_of_user_count(self):
+        """Test que l'inscription ne génère pas de requêtes N+1."""
+        with CaptureQueriesContext(connection) as baseline:
+            response = self.client.post(
+                self.register_url,
+                self._registration_data("675799807"),
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # D'autres utilisateurs existent désormais en base
+        _create_user("+675799745", is_active=True)
+        _create_user("+675799746", is_active=False)
+
+        with self.assertNumQueries(len(baseline)):
+            response = self.client.post(
+                self.register_url,
+                self._registration_data("675799808"),
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
@@ -5,6 +5,8 @@ Ce module teste toutes les fonctionnalités du système de mocks
 utilisé pour isoler les tests des services externes.
 """
 
+from unittest.mock import patch
+
 import pytest
 from users.tests.mocks import (
     MockSmsGateway,
@@ -12,6 +14,12 @@ from users.tests.mocks import (
     patch_twilio_gateway,
     MockServices,
 )
+from users.gateways.sms import (
+    DummySmsGateway,
+    _build_sms_gateway,
+    send_confirmation_batch_in_background,
+    send_confirmation_in_background,
+)
 
 
 class TestMockSmsGateway:
@@ -22,7 +30,8 @@ class TestMockSmsGateway:
         mock = MockSmsGateway()
         assert mock.should_succeed is True
         assert mock.error_message is None
-        assert mock.sent_messages == []
+        assert len(mock.sent_messages) == 0
+        assert mock.by_phone == {}
 
     def test_mock_sms_gateway_init_with_error(self):
         """Test initialisation avec configuration d'erreur."""
@@ -30,7 +39,17 @@ class TestMockSmsGateway:
         mock = MockSmsGateway(should_succeed=False, error_message=error_msg)
         assert mock.should_succeed is False
         assert mock.error_message == error_msg
-        assert mock.sent_messages == []
+        assert len(mock.sent_messages) == 0
+
+    def test_sent_messages_is_bounded(self):
+        """Test que l'historique des messages envoyés est borné."""
+        mock = MockSmsGateway()
+
+        for i in range(MockSmsGateway.MAX_SENT_MESSAGES + 1):
+            mock.send_activation_code("+237658552294", str(i))
+
+        assert len(mock.sent_messages) == MockSmsGateway.MAX_SENT_MESSAGES
+        assert mock.sent_messages[0]["code"] == "1"
 
     def test_send_activation_code_success(self):
         """Test envoi réussi de code d'activation."""
@@ -82,52 +101,27 @@ class TestMockSmsGateway:
         mock.send_activation_code("+237658552295", "222222")
 
         assert len(mock.sent_messages) == 2
-        assert mock.sent_messages[0]["code"] == "111111"
-        assert mock.sent_messages[1]["code"] == "222222"
-
-    def test_empty_phone_number(self):
-        """Test avec numéro de téléphone vide."""
-        mock = MockSmsGateway()
-        result = mock.send_activation_code("", "123456")
-        assert result is True
-        assert len(mock.sent_messages) == 1
-        assert mock.sent_messages[0]["phone"] == ""
-
-    def test_empty_code(self):
-        """Test avec code vide."""
-        mock = MockSmsGateway()
-        result = mock.send_activation_code("+237658552294", "")
-        assert result is True
-        assert len(mock.sent_messages) == 1
-        assert mock.sent_messages[0]["code"] == ""
-
-    def test_none_values(self):
-        """Test avec valeurs None."""
-        mock = MockSmsGateway()
-        # Convertir None en string pour respecter le type attendu
-        result = mock.send_activation_code(str(None), str(None))
-        assert result is True
-        assert len(mock.sent_messages) == 1
-        assert mock.sent_messages[0]["phone"] == "None"
-        assert mock.sent_messages[0]["code"] == "None"
-
-    def test_special_characters_in_phone(self):
-        """Test avec caractères spéciaux dans le numéro."""
-        mock = MockSmsGateway()
-        special_phone = "+237-658-552-294"
-        result = mock.send_activation_code(special_phone, "123456")
-        assert result is True
-        assert len(mock.sent_messages) == 1
-        assert mock.sent_messages[0]["phone"] == special_phone
-
-    def test_long_code(self):
-        """Test avec code très long."""
+        assert mock.by_phone["+237658552294"]["code"] == "111111"
+        assert mock.by_phone["+237658552295"]["code"] == "222222"
+
+    @pytest.mark.parametrize(
+        "phone,code",
+        [
+            ("", "123456"),  # Numéro vide
+            ("+237658552294", ""),  # Code vide
+            (str(None), str(None)),  # Valeurs None converties en string
+            ("+237-658-552-294", "123456"),  # Caractères spéciaux
+            ("+237658552294", "12345678901234567890"),  # Code très long
+        ],
+    )
+    def test_send_variants(self, phone, code):
+        """Test que les entrées inhabituelles sont enregistrées telles quelles."""
         mock = MockSmsGateway()
-        long_code = "12345678901234567890"
-        result = mock.send_activation_code("+237658552294", long_code)
+        result = mock.send_activation_code(phone, code)
         assert result is True
         assert len(mock.sent_messages) == 1
-        assert mock.sent_messages[0]["code"] == long_code
+        assert mock.sent_messages[0]["phone"] == phone
+        assert mock.sent_messages[0]["code"] == code
 
 
 class TestPatchSmsGateway:
@@ -201,3 +195,67 @@ class TestMockServices:
             assert len(mock2.sent_messages) == 1
             # Le mock2 ne doit pas voir les messages du mock1
             assert mock2.sent_messages[0]["phone"] == "+237658552295"
+
+
+class TestSendConfirmationInBackground:
+    """Tests pour l'envoi des confirmations hors du thread de requête."""
+
+    def test_confirmation_sent_in_background(self):
+        """Test que la confirmation est bien envoyée par le pool."""
+        mock = MockSmsGateway()
+
+        future = send_confirmation_in_background(
+            mock, "+237670000000", "password_reset"
+        )
+
+        assert future.result(timeout=5) is True
+        assert mock.sent_messages[0]["operation_type"] == "password_reset"
+
+    def test_confirmation_failure_is_swallowed(self):
+        """Test qu'une erreur d'envoi est journalisée sans être propagée."""
+        mock = MockSmsGateway(should_succeed=False, error_message="Erreur réseau")
+
+        future = send_confirmation_in_background(
+            mock, "+237670000000", "password_change"
+        )
+
+        assert future.result(timeout=5) is False
+
+    def test_confirmation_batch_sent_in_single_call(self):
+        """Test que les confirmations groupées partent en un seul appel."""
+        mock = MockSmsGateway()
+        messages = [
+            (
+                "+237670000000",
+                "phone_change",
+                "Votre nouveau numéro est: +237670000001",
+            ),
+            ("+237670000001", "phone_change", None),
+        ]
+
+        with patch.object(
+            mock, "send_confirmation_batch", wraps=mock.send_confirmation_batch
+        ) as batch:
+            future = send_confirmation_batch_in_background(mock, messages)
+
+            assert future.result(timeout=5) is True
+
+        batch.assert_called_once_with(messages)
+        assert [m["phone"] for m in mock.sent_messages] == [
+            "+237670000000",
+            "+237670000001",
+        ]
+
+
+class TestSmsGatewayFactory:
+    """Tests pour la construction mise en cache du gateway SMS."""
+
+    def test_build_sms_gateway_reuses_instance(self):
+        """Test que le gateway est construit une seule fois par configuration."""
+        _build_sms_gateway.cache_clear()
+
+        first = _build_sms_gateway(True)
+        second = _build_sms_gateway(True)
+
+        assert isinstance(first, DummySmsGateway)
+        assert first is second
@@ -5,6 +5,8 @@ Ce module teste la création et validation des utilisateurs
 avec le modèle User personnalisé.
 """
 
+from django.db import IntegrityError, transaction
+
 from users.models import User
 from .test_settings import MockedTestCase
 
@@ -12,19 +14,21 @@ from .test_settings import MockedTestCase
 class UserModelTestCase(MockedTestCase):
     """Tests pour le modèle User personnalisé."""
 
-    def setUp(self) -> None:
-        """Configuration initiale pour les tests."""
-        super().setUp()
-        self.user_data = {
-            "phone": "670000000",
-            "first_name": "John",
-            "last_name": "Doe",
-            "password": "testpassword123",
-        }
+    user_data = {
+        "phone": "670000000",
+        "first_name": "John",
+        "last_name": "Doe",
+        "password": "testpassword123",
+    }
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """Crée une seule fois l'utilisateur partagé par les tests de la classe."""
+        cls.user = User.objects.create_user(**cls.user_data)
 
     def test_create_user_with_valid_data(self) -> None:
         """Test de création d'un utilisateur avec des données valides."""
-        user = User.objects.create_user(**self.user_data)
+        user = self.user
 
         self.assertEqual(user.phone, "+670000000")
         self.assertEqual(user.first_name, "John")
@@ -37,23 +41,23 @@ class UserModelTestCase(MockedTestCase):
 
     def test_user_str_representation(self) -> None:
         """Test de la représentation string de l'utilisateur."""
-        user = User.objects.create_user(**self.user_data)
+        user = self.user
         expected = "John Doe (+670000000)"
         self.assertEqual(str(user), expected)
 
     def test_get_full_name(self) -> None:
         """Test de la méthode get_full_name."""
-        user = User.objects.create_user(**self.user_data)
+        user = self.user
         self.assertEqual(user.get_full_name(), "John Doe")
 
     def test_get_short_name(self) -> None:
         """Test de la méthode get_short_name."""
-        user = User.objects.create_user(**self.user_data)
+        user = self.user
         self.assertEqual(user.get_short_name(), "John")
 
     def test_is_admin_property(self) -> None:
         """Test de la propriété is_admin."""
-        user = User.objects.create_user(**self.user_data)
+        user = self.user
         self.assertFalse(user.is_admin)
 
         user.is_staff = True
@@ -65,11 +69,29 @@ class UserModelTestCase(MockedTestCase):
 
     def test_phone_uniqueness(self) -> None:
         """Test de l'unicité du numéro de téléphone."""
-        User.objects.create_user(**self.user_data)
-
+        # self.user occupe déjà ce numéro
         with self.assertRaises(Exception):  # IntegrityError ou ValidationError
             User.objects.create_user(**self.user_data)
 
+    def test_phone_unique_constraint(self) -> None:
+        """Test de la contrainte d'unicité du téléphone au niveau de la base."""
+        # bulk_create contourne create_user : ni signaux, ni hachage
+        duplicate = User(
+            phone=self.user.phone,
+            first_name="Jane",
+            last_name="Doe",
+            password=self.user.password,
+        )
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.bulk_create([duplicate])
+
+    def test_phone_international_format_constraint(self) -> None:
+        """Test que la base refuse un numéro qui n'est pas au format international."""
+        # update() contourne User.save et donc la normalisation du numéro
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.filter(pk=self.user.pk).update(phone="0612345678")
+
     def test_required_fields_validation(self) -> None:
         """Test de validation des champs obligatoires."""
         # Test sans prénom
@@ -92,16 +114,27 @@ class UserModelTestCase(MockedTestCase):
 
     def test_phone_cleaning(self) -> None:
         """Test du nettoyage du numéro de téléphone."""
-        user_data = self.user_data.copy()
         # Format avec espaces et préfixe
-        user_data["phone"] = "+237 67 00 00 000"
+        user_data = {**self.user_data, "phone": "+237 67 00 00 000"}
 
         user = User.objects.create_user(**user_data)
         self.assertEqual(user.phone, "+237670000000")  # Format international
 
+    def test_phone_normalized_on_save(self) -> None:
+        """Test que save() normalise le numéro modifié directement."""
+        user = self.user
+
+        user.phone = "237 67 00 00 001"
+        user.save(update_fields=["phone"])
+
+        user.refresh_from_db()
+        self.assertEqual(user.phone, "+237670000001")
+
     def test_create_superuser(self) -> None:
         """Test de création d'un superutilisateur."""
-        superuser = User.objects.create_superuser(**self.user_data)
+        superuser_data = {**self.user_data, "phone": "670000003"}
+
+        superuser = User.objects.create_superuser(**superuser_data)
 
         self.assertTrue(superuser.is_staff)
         self.assertTrue(superuser.is_superuser)
@@ -109,10 +142,12 @@ class UserModelTestCase(MockedTestCase):
 
     def test_optional_fields(self) -> None:
         """Test des champs optionnels."""
-        user_data = self.user_data.copy()
-        user_data.update(
-            {"email": "john.doe@example.com", "address": "123 Main St, City"}
-        )
+        user_data = {
+            **self.user_data,
+            "phone": "670000004",
+            "email": "john.doe@example.com",
+            "address": "123 Main St, City",
+        }
 
         user = User.objects.create_user(**user_data)
 
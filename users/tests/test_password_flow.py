@@ -0,0 +1,76 @@
+"""
+Tests communs aux flux de changement et de réinitialisation de mot de passe.
+
+Les deux flux confirment le nouveau mot de passe avec le même format
+(token, code SMS, mot de passe et confirmation) : leurs règles de
+validation sont testées ici une seule fois pour les deux serializers.
+"""
+
+from django.test import SimpleTestCase
+
+from users.serializers import (
+    PasswordChangeConfirmSerializer,
+    PasswordResetConfirmSerializer,
+)
+
+# Serializers de confirmation des deux flux
+CONFIRM_SERIALIZERS = (PasswordChangeConfirmSerializer, PasswordResetConfirmSerializer)
+
+# Données de confirmation valides, déclinées par chaque cas invalide
+VALID_CONFIRM_DATA = {
+    "token": "00000000-0000-0000-0000-000000000000",
+    "code": "123456",
+    "new_password": "newpassword123",
+    "new_password_confirm": "newpassword123",
+}
+
+# (cas, données, {champ en erreur: extrait attendu de son message})
+INVALID_CONFIRM_CASES = [
+    # Mot de passe trop court
+    (
+        "weak_password",
+        {**VALID_CONFIRM_DATA, "new_password": "123", "new_password_confirm": "123"},
+        {"new_password": ""},
+    ),
+    # Manque code, new_password, new_password_confirm
+    (
+        "missing_fields",
+        {"token": VALID_CONFIRM_DATA["token"]},
+        {"code": "", "new_password": ""},
+    ),
+    # Code trop court : le message indique la longueur attendue
+    ("invalid_code_format", {**VALID_CONFIRM_DATA, "code": "12345"}, {"code": "6"}),
+    # Token qui n'est pas un UUID
+    (
+        "invalid_token_format",
+        {**VALID_CONFIRM_DATA, "token": "invalid-uuid"},
+        {"token": ""},
+    ),
+]
+
+
+class PasswordConfirmSerializerTestCase(SimpleTestCase):
+    """
+    Tests de validation des serializers de confirmation de mot de passe.
+
+    Ces tests n'utilisent ni la base de données ni la pile HTTP.
+    """
+
+    def test_valid_payload(self):
+        """Test que des données de confirmation complètes sont acceptées."""
+        for serializer_class in CONFIRM_SERIALIZERS:
+            with self.subTest(serializer=serializer_class.__name__):
+                serializer = serializer_class(data=VALID_CONFIRM_DATA)
+                self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_invalid_payloads(self):
+        """Test que chaque donnée de confirmation invalide est rejetée."""
+        for serializer_class in CONFIRM_SERIALIZERS:
+            for name, data, expected_errors in INVALID_CONFIRM_CASES:
+                with self.subTest(serializer=serializer_class.__name__, case=name):
+                    serializer = serializer_class(data=data)
+
+                    self.assertFalse(serializer.is_valid())
+                    for field, fragment in expected_errors.items():
+                        self.assertIn(field, serializer.errors)
+                        self.assertIn(fragment, str(serializer.errors[field]))
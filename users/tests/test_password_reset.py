@@ -7,31 +7,44 @@ via SMS avec le nouveau modèle VerificationToken.
 
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APIClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import Mock, patch
 
+from users.gateways.sms import ISmsGateway
 from users.models import User, VerificationToken
 from users.tests.test_settings import MockedAPITestCase
 
+# Token UUID transmis tel quel au service mocké (aucun enregistrement en base)
+_TOKEN = "11111111-1111-1111-1111-111111111111"
+
 
 class PasswordResetTestCase(MockedAPITestCase):
     """
     Tests pour la réinitialisation de mot de passe.
     """
 
-    def setUp(self):
-        super().setUp()
-        self.client = APIClient()
-
-        # Créer un utilisateur de test
-        self.user = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        # Créer une seule fois l'utilisateur de test
+        cls.user = User.objects.create_user(
             phone="+237670000000",
             first_name="Test",
             last_name="User",
             password="oldpassword123",
+            is_active=True,
+        )
+
+        # Résoudre les URLs une seule fois pour toute la classe
+        cls.forgot_url = reverse("users:password_forgot")
+        cls.reset_confirm_url = reverse("users:password_reset_confirm")
+
+    def setUp(self):
+        super().setUp()
+
+        # Service de confirmation patché une seule fois : chaque test
+        # configure le mock (la demande reste réelle pour certains tests)
+        self.mock_confirm_service = self.enterContext(
+            patch("users.services.PasswordResetService.confirm_password_reset")
         )
-        self.user.is_active = True
-        self.user.save()
 
         # Données de test
         self.forgot_data = {"phone": "+237670000000"}
@@ -45,7 +58,7 @@ class PasswordResetTestCase(MockedAPITestCase):
 
     def test_password_forgot_success(self):
         """Test de demande de réinitialisation réussie."""
-        url = reverse("users:password_forgot")
+        url = self.forgot_url
 
         with patch(
             "users.services.PasswordResetService.request_password_reset"
@@ -64,7 +77,7 @@ class PasswordResetTestCase(MockedAPITestCase):
 
     def test_password_forgot_user_not_exists(self):
         """Test de demande de réinitialisation pour utilisateur inexistant."""
-        url = reverse("users:password_forgot")
+        url = self.forgot_url
 
         # Utiliser un numéro qui n'existe pas
         data = {"phone": "+237999999999"}
@@ -85,7 +98,7 @@ class PasswordResetTestCase(MockedAPITestCase):
 
     def test_password_forgot_invalid_phone(self):
         """Test de demande de réinitialisation avec numéro invalide."""
-        url = reverse("users:password_forgot")
+        url = self.forgot_url
 
         data = {"phone": "123"}  # Numéro trop court
 
@@ -98,7 +111,7 @@ class PasswordResetTestCase(MockedAPITestCase):
 
     def test_password_forgot_missing_phone(self):
         """Test de demande de réinitialisation sans numéro."""
-        url = reverse("users:password_forgot")
+        url = self.forgot_url
 
         data = {}
 
@@ -109,80 +122,64 @@ class PasswordResetTestCase(MockedAPITestCase):
 
     def test_password_reset_confirm_success(self):
         """Test de confirmation de réinitialisation réussie."""
-        # Créer un token de test
-        token = VerificationToken.create_token(
-            verification_type="password_reset", user=self.user
-        )
+        url = self.reset_confirm_url
 
-        url = reverse("users:password_reset_confirm")
+        self.reset_data["token"] = _TOKEN
 
-        self.reset_data["token"] = str(token.token)
-
-        with patch(
-            "users.services.PasswordResetService.confirm_password_reset"
-        ) as mock_service:
-            mock_service.return_value = {
-                "success": True,
-                "message": "Votre mot de passe a été réinitialisé avec succès.",
-            }
+        mock_service = self.mock_confirm_service
+        mock_service.return_value = {
+            "success": True,
+            "message": "Votre mot de passe a été réinitialisé avec succès.",
+        }
 
-            response = self.client.post(url, self.reset_data, format="json")
+        response = self.client.post(url, self.reset_data, format="json")
 
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
-            self.assertEqual(response.data["status"], "success")
-            # Vérifier que le service a été appelé avec les bons paramètres
-            call_args = mock_service.call_args[0]
-            self.assertEqual(str(call_args[0]), str(token.token))
-            self.assertEqual(call_args[1], "123456")
-            self.assertEqual(call_args[2], "newpassword123")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "success")
+        # Vérifier que le service a été appelé avec les bons paramètres
+        call_args = mock_service.call_args[0]
+        self.assertEqual(str(call_args[0]), _TOKEN)
+        self.assertEqual(call_args[1], "123456")
+        self.assertEqual(call_args[2], "newpassword123")
 
     def test_password_reset_confirm_invalid_token(self):
         """Test de confirmation avec token invalide."""
-        url = reverse("users:password_reset_confirm")
+        url = self.reset_confirm_url
 
         self.reset_data["token"] = "00000000-0000-0000-0000-000000000000"
 
-        with patch(
-            "users.services.PasswordResetService.confirm_password_reset"
-        ) as mock_service:
-            mock_service.side_effect = ValueError(
-                "Token de réinitialisation invalide ou expiré"
-            )
+        mock_service = self.mock_confirm_service
+        mock_service.side_effect = ValueError(
+            "Token de réinitialisation invalide ou expiré"
+        )
 
-            response = self.client.post(url, self.reset_data, format="json")
+        response = self.client.post(url, self.reset_data, format="json")
 
-            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-            self.assertEqual(response.data["status"], "error")
-            self.assertIn("invalide", response.data["data"]["detail"])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["status"], "error")
+        self.assertIn("invalide", response.data["data"]["detail"])
 
     def test_password_reset_confirm_invalid_code(self):
         """Test de confirmation avec code invalide."""
-        # Créer un token de test
-        token = VerificationToken.create_token(
-            verification_type="password_reset", user=self.user
-        )
-
-        url = reverse("users:password_reset_confirm")
+        url = self.reset_confirm_url
 
-        self.reset_data["token"] = str(token.token)
+        self.reset_data["token"] = _TOKEN
         self.reset_data["code"] = "000000"  # Code incorrect
 
-        with patch(
-            "users.services.PasswordResetService.confirm_password_reset"
-        ) as mock_service:
-            mock_service.side_effect = ValueError(
-                "Code de vérification incorrect ou expiré"
-            )
+        mock_service = self.mock_confirm_service
+        mock_service.side_effect = ValueError(
+            "Code de vérification incorrect ou expiré"
+        )
 
-            response = self.client.post(url, self.reset_data, format="json")
+        response = self.client.post(url, self.reset_data, format="json")
 
-            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-            self.assertEqual(response.data["status"], "error")
-            self.assertIn("incorrect", response.data["data"]["detail"])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["status"], "error")
+        self.assertIn("incorrect", response.data["data"]["detail"])
 
     def test_password_reset_confirm_password_mismatch(self):
         """Test de confirmation avec mots de passe différents."""
-        url = reverse("users:password_reset_confirm")
+        url = self.reset_confirm_url
 
         data = {
             "token": "00000000-0000-0000-0000-000000000000",
@@ -197,94 +194,29 @@ class PasswordResetTestCase(MockedAPITestCase):
         self.assertEqual(response.data["status"], "error")
         self.assertIn("correspondent pas", str(response.data["data"]))
 
-    def test_password_reset_confirm_weak_password(self):
-        """Test de confirmation avec mot de passe faible."""
-        url = reverse("users:password_reset_confirm")
-
-        data = {
-            "token": "00000000-0000-0000-0000-000000000000",
-            "code": "123456",
-            "new_password": "123",  # Mot de passe trop court
-            "new_password_confirm": "123",
-        }
-
-        response = self.client.post(url, data, format="json")
-
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertEqual(response.data["status"], "error")
-
-    def test_password_reset_confirm_missing_fields(self):
-        """Test de confirmation avec champs manquants."""
-        url = reverse("users:password_reset_confirm")
-
-        data = {
-            "token": "00000000-0000-0000-0000-000000000000"
-            # Manque code, new_password, new_password_confirm
-        }
-
-        response = self.client.post(url, data, format="json")
-
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertEqual(response.data["status"], "error")
-
-    def test_password_reset_confirm_invalid_code_format(self):
-        """Test de confirmation avec format de code invalide."""
-        url = reverse("users:password_reset_confirm")
-
-        data = {
-            "token": "00000000-0000-0000-0000-000000000000",
-            "code": "12345",  # Code trop court
-            "new_password": "newpassword123",
-            "new_password_confirm": "newpassword123",
-        }
-
-        response = self.client.post(url, data, format="json")
-
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertEqual(response.data["status"], "error")
-        self.assertIn("6", str(response.data["data"]))
-
-    def test_password_reset_confirm_invalid_token_format(self):
-        """Test de confirmation avec format de token invalide."""
-        url = reverse("users:password_reset_confirm")
-
-        data = {
-            "token": "invalid-uuid",
-            "code": "123456",
-            "new_password": "newpassword123",
-            "new_password_confirm": "newpassword123",
-        }
-
-        response = self.client.post(url, data, format="json")
-
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertEqual(response.data["status"], "error")
-
 
 class PasswordResetServiceTestCase(MockedAPITestCase):
     """
     Tests pour le service de réinitialisation de mot de passe.
     """
 
-    def setUp(self):
-        super().setUp()
-
-        # Créer un utilisateur de test
-        self.user = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        # Créer une seule fois l'utilisateur de test
+        cls.user = User.objects.create_user(
             phone="+237670000000",
             first_name="Test",
             last_name="User",
             password="oldpassword123",
+            is_active=True,
         )
-        self.user.is_active = True
-        self.user.save()
 
     def test_request_password_reset_existing_user(self):
         """Test de demande de réinitialisation pour utilisateur existant."""
         from users.services import PasswordResetService
 
         with patch("users.services.get_sms_gateway") as mock_gateway:
-            mock_sms = MagicMock()
+            mock_sms = Mock(spec=ISmsGateway)
             mock_sms.send_verification_code.return_value = True
             mock_gateway.return_value = mock_sms
 
@@ -304,6 +236,23 @@ class PasswordResetServiceTestCase(MockedAPITestCase):
             call_args = mock_sms.send_verification_code.call_args[0]
             self.assertEqual(call_args[0], "+237670000000")
 
+    def test_request_password_reset_stores_hash_of_sent_code(self):
+        """Test que le hash stocké correspond au code envoyé par SMS."""
+        from users.services import PasswordResetService
+
+        with patch("users.services.get_sms_gateway") as mock_gateway:
+            mock_sms = Mock(spec=ISmsGateway)
+            mock_sms.send_verification_code.return_value = True
+            mock_gateway.return_value = mock_sms
+
+            PasswordResetService.request_password_reset("+237670000000")
+
+            sent_code = mock_sms.send_verification_code.call_args[0][1]
+            token = VerificationToken.objects.get(
+                verification_type="password_reset", user=self.user
+            )
+            self.assertEqual(token.code_hash, VerificationToken.hash_code(sent_code))
+
     def test_request_password_reset_nonexistent_user(self):
         """Test de demande de réinitialisation pour utilisateur inexistant."""
         from users.services import PasswordResetService
@@ -351,6 +300,20 @@ class PasswordResetServiceTestCase(MockedAPITestCase):
 
         self.assertIn("invalide", str(context.exception))
 
+    def test_confirm_password_reset_invalid_token_still_hashes_code(self):
+        """Test qu'un token inconnu coûte autant qu'un code incorrect."""
+        from users.services import PasswordResetService
+
+        with patch.object(
+            VerificationToken, "hash_code", wraps=VerificationToken.hash_code
+        ) as mock_hash:
+            with self.assertRaises(ValueError):
+                PasswordResetService.confirm_password_reset(
+                    "00000000-0000-0000-0000-000000000000", "123456", "newpassword123"
+                )
+
+        mock_hash.assert_called_once_with("123456")
+
     def test_confirm_password_reset_invalid_code(self):
         """Test de confirmation avec code invalide."""
         from users.services import PasswordResetService
@@ -5,6 +5,7 @@ Ce module teste les fonctionnalités de changement de numéro de téléphone
 via SMS avec vérification sur le nouveau numéro.
 """
 
+from django.db import transaction
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -30,9 +31,8 @@ class PhoneChangeTestCase(MockedAPITestCase):
             first_name="Test",
             last_name="User",
             password="testpassword123",
+            is_active=True,
         )
-        self.user.is_active = True
-        self.user.save()
 
         # Obtenir un token JWT pour l'authentification
         refresh = RefreshToken.for_user(self.user)
@@ -260,9 +260,8 @@ class PhoneChangeServiceTestCase(MockedAPITestCase):
             first_name="Test",
             last_name="User",
             password="testpassword123",
+            is_active=True,
         )
-        self.user.is_active = True
-        self.user.save()
 
     def test_request_phone_change_success(self):
         """Test de demande de changement de numéro réussie."""
@@ -332,6 +331,59 @@ class PhoneChangeServiceTestCase(MockedAPITestCase):
             token.refresh_from_db()
             self.assertTrue(token.is_used)
 
+    def test_confirm_phone_change_sends_batch_on_commit(self):
+        """Test que les confirmations partent en un seul lot après le commit."""
+        from users.services import PhoneChangeService
+
+        token = VerificationToken.create_token(
+            verification_type="phone_change", user=self.user, phone="+237670000001"
+        )
+
+        with patch.object(VerificationToken, "verify_code", return_value=True), patch(
+            "users.services.send_confirmation_batch_in_background"
+        ) as mock_send:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                PhoneChangeService.confirm_phone_change(str(token.token), "123456")
+
+                # Rien n'est envoyé avant la validation de la transaction
+                mock_send.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+        mock_send.assert_called_once()
+        _, confirmations = mock_send.call_args[0]
+        # Un seul lot pour l'ancien ET le nouveau numéro
+        self.assertEqual(
+            [phone for phone, _, _ in confirmations],
+            ["+237670000000", "+237670000001"],
+        )
+        self.assertIn("+237670000001", confirmations[0][2])
+
+    def test_confirm_phone_change_rollback_sends_nothing(self):
+        """Test qu'aucun SMS ne part si la transaction englobante est annulée."""
+        from users.services import PhoneChangeService
+
+        token = VerificationToken.create_token(
+            verification_type="phone_change", user=self.user, phone="+237670000001"
+        )
+
+        with patch.object(VerificationToken, "verify_code", return_value=True), patch(
+            "users.services.send_confirmation_batch_in_background"
+        ) as mock_send:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                with self.assertRaises(RuntimeError):
+                    with transaction.atomic():
+                        PhoneChangeService.confirm_phone_change(
+                            str(token.token), "123456"
+                        )
+                        raise RuntimeError("annulation")
+
+        self.assertEqual(callbacks, [])
+        mock_send.assert_not_called()
+
+        # Le changement de numéro est annulé avec la transaction
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.phone, "+237670000000")
+
     def test_confirm_phone_change_invalid_token(self):
         """Test de confirmation avec token invalide."""
         from users.services import PhoneChangeService
@@ -383,6 +435,12 @@ class PhoneChangeServiceTestCase(MockedAPITestCase):
 
             self.assertIn("maintenant utilisé", str(context.exception))
 
+            # Le token n'est pas consommé et le numéro reste inchangé
+            token.refresh_from_db()
+            self.assertFalse(token.is_used)
+            self.user.refresh_from_db()
+            self.assertNotEqual(self.user.phone, "+237670000001")
+
     def test_confirm_phone_change_expired_token(self):
         """Test de confirmation avec token expiré."""
         from users.services import PhoneChangeService
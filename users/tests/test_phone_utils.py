@@ -9,6 +9,7 @@ from users.utils.phone_utils import (
     normalize_phone,
     validate_phone_length,
     clean_phone_for_display,
+    to_international_phone,
 )
 
 
@@ -71,6 +72,25 @@ class TestNormalizePhone:
         assert result == "+"
 
 
+class TestToInternationalPhone:
+    """Tests pour la fonction to_international_phone."""
+
+    def test_to_international_phone_strips_non_digits(self):
+        """Test que seuls les chiffres sont conservés."""
+        assert to_international_phone("+237 670-000-000") == "+237670000000"
+
+    def test_to_international_phone_adds_plus(self):
+        """Test que le préfixe + est ajouté."""
+        assert to_international_phone("(675) 799-752") == "+675799752"
+
+    def test_to_international_phone_is_cached(self):
+        """Test que les appels répétés sont servis par le cache."""
+        to_international_phone.cache_clear()
+        to_international_phone("675799743")
+        to_international_phone("675799743")
+        assert to_international_phone.cache_info().hits == 1
+
+
 class TestValidatePhoneLength:
     """Tests pour la fonction validate_phone_length."""
 
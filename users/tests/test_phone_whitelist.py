@@ -111,11 +111,6 @@ class PhoneWhitelistAPITestCase(APITestCase):
         self.admin_user.is_staff = True
         self.admin_user.save()
 
-    def tearDown(self):
-        """Nettoyage après chaque test."""
-        User.objects.all().delete()
-        PhoneWhitelist.objects.all().delete()
-
     def test_register_authorized_phone_success(self):
         """Test d'inscription avec un numéro autorisé."""
         from unittest.mock import patch
@@ -33,9 +33,8 @@ class ProfileUpdateTestCase(MockedAPITestCase):
             address="123 Test Street",
             apartment_name="A1",
             password="testpassword123",
+            is_active=True,
         )
-        self.user.is_active = True
-        self.user.save()
 
         # Obtenir un token JWT pour l'authentification
         refresh = RefreshToken.for_user(self.user)
@@ -250,9 +249,8 @@ class ProfileServiceTestCase(MockedAPITestCase):
             address="123 Test Street",
             apartment_name="A1",
             password="testpassword123",
+            is_active=True,
         )
-        self.user.is_active = True
-        self.user.save()
 
     def test_update_profile_success(self):
         """Test de mise à jour du profil réussie."""
@@ -30,10 +30,6 @@ class RegisterSerializerTestCase(MockedTestCase, WhitelistTestCase):
             "address": "123 Main St, City",
         }
 
-    def tearDown(self) -> None:
-        """Nettoyage après chaque test."""
-        User.objects.all().delete()
-
     def test_valid_registration_data(self) -> None:
         """Test avec des données d'inscription valides."""
         # Ajouter le numéro à la liste blanche
@@ -148,10 +144,6 @@ class LoginSerializerTestCase(MockedTestCase):
 
         self.valid_data = {"phone": "670000000", "password": "testpassword123"}
 
-    def tearDown(self) -> None:
-        """Nettoyage après chaque test."""
-        User.objects.all().delete()
-
     def test_valid_login_data(self) -> None:
         """Test avec des données de connexion valides."""
         serializer = LoginSerializer(data=self.valid_data)
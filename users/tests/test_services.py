@@ -5,7 +5,23 @@ Ce module teste la logique métier des services d'inscription,
 connexion et gestion des utilisateurs.
 """
 
-from users.services import AuthService, ResponseService
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from users.services import (
+    AuthService,
+    ResponseService,
+    _pending_last_logins,
+    _record_last_login,
+    _schedule_last_login,
+)
 from users.models import User
 from .test_settings import MockedTestCase
 
@@ -24,10 +40,6 @@ class AuthServiceTestCase(MockedTestCase):
             "email": "john.doe@example.com",
         }
 
-    def tearDown(self) -> None:
-        """Nettoyage après chaque test."""
-        User.objects.all().delete()
-
     def test_register_user_success(self) -> None:
         """Test d'inscription réussie d'un utilisateur."""
         user = AuthService.register_user(self.user_data)
@@ -67,6 +79,45 @@ class AuthServiceTestCase(MockedTestCase):
         self.assertEqual(authenticated_user, user)
         self.assertIsNotNone(authenticated_user.last_login)
 
+    def test_authenticate_user_defers_last_login_write(self) -> None:
+        """Test que last_login est écrit hors de la requête, après commit."""
+        user = User.objects.create_user(**self.user_data)
+        user.is_active = True
+        user.save()
+
+        with patch.dict(_pending_last_logins, clear=True), patch(
+            "users.services._last_login_executor"
+        ) as mock_executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                authenticated_user = AuthService.authenticate_user(
+                    "670000000", "testpassword123"
+                )
+
+            mock_executor.submit.assert_called_once_with(_record_last_login, user.pk)
+            self.assertEqual(
+                _pending_last_logins[user.pk], authenticated_user.last_login
+            )
+
+    def test_schedule_last_login_keeps_one_task_per_user(self) -> None:
+        """Test que les connexions successives ne gardent que la plus récente."""
+        user = User.objects.create_user(**self.user_data)
+        first_login = timezone.now()
+        second_login = first_login + timedelta(seconds=1)
+
+        with patch.dict(_pending_last_logins, clear=True), patch(
+            "users.services._last_login_executor"
+        ) as mock_executor, patch("users.services.close_old_connections"):
+            _schedule_last_login(user.pk, first_login)
+            _schedule_last_login(user.pk, second_login)
+
+            mock_executor.submit.assert_called_once_with(_record_last_login, user.pk)
+
+            _record_last_login(user.pk)
+            self.assertNotIn(user.pk, _pending_last_logins)
+
+        user.refresh_from_db()
+        self.assertEqual(user.last_login, second_login)
+
     def test_authenticate_user_wrong_password(self) -> None:
         """Test d'authentification avec mauvais mot de passe."""
         User.objects.create_user(**self.user_data)
@@ -118,6 +169,38 @@ class AuthServiceTestCase(MockedTestCase):
 
         self.assertIn("incorrect", str(context.exception))
 
+    def test_refresh_user_tokens_rotates_refresh_token(self) -> None:
+        """Test que le refresh token est renouvelé pour le même utilisateur."""
+        user = User.objects.create_user(**self.user_data)
+        old_refresh = RefreshToken.for_user(user)
+
+        refreshed_user, tokens = AuthService.refresh_user_tokens(str(old_refresh))
+
+        new_refresh = RefreshToken(tokens["refresh"])
+        self.assertEqual(refreshed_user, user)
+        self.assertEqual(new_refresh["user_id"], old_refresh["user_id"])
+        self.assertNotEqual(new_refresh["jti"], old_refresh["jti"])
+        self.assertEqual(
+            AccessToken(tokens["access"])["user_id"], old_refresh["user_id"]
+        )
+
+    def test_refresh_user_tokens_blacklists_old_token(self) -> None:
+        """Test que l'ancien refresh token est blacklisté et le nouveau suivi."""
+        user = User.objects.create_user(**self.user_data)
+        old_refresh = RefreshToken.for_user(user)
+
+        _, tokens = AuthService.refresh_user_tokens(str(old_refresh))
+
+        self.assertTrue(
+            BlacklistedToken.objects.filter(token__jti=old_refresh["jti"]).exists()
+        )
+        new_jti = RefreshToken(tokens["refresh"])["jti"]
+        self.assertTrue(OutstandingToken.objects.filter(jti=new_jti).exists())
+
+        # L'ancien token ne peut plus être réutilisé
+        with self.assertRaises(ValueError):
+            AuthService.refresh_user_tokens(str(old_refresh))
+
     def test_get_user_profile(self) -> None:
         """Test de récupération du profil utilisateur."""
         user = User.objects.create_user(**self.user_data)
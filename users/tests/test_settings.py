@@ -6,7 +6,9 @@ avec les mocks automatiquement configurés.
 """
 
 from django.test import TestCase
+from rest_framework.test import APIClient
 from unittest.mock import patch
+from users.gateways.sms import _build_sms_gateway
 from users.tests.mocks import MockSmsGateway
 
 
@@ -40,6 +42,11 @@ class MockedTestCase(TestCase):
         self.twilio_mock = self.twilio_patcher.start()
         self.twilio_mock.return_value = self.mock_sms
 
+        # Le gateway réel est mis en cache au niveau du module : le vider
+        # après chaque test pour qu'aucun état ne fuie d'un test à l'autre,
+        # y compris dans un worker de « manage.py test --parallel »
+        self.addCleanup(_build_sms_gateway.cache_clear)
+
     def tearDown(self):
         """Nettoyage des mocks."""
         super().tearDown()
@@ -60,9 +67,17 @@ class MockedAPITestCase(MockedTestCase):
     Hérite de MockedTestCase et ajoute le client API Django REST Framework.
     """
 
+    @classmethod
+    def setUpClass(cls):
+        """Crée un client API unique partagé par les tests de la classe."""
+        super().setUpClass()
+        cls.api_client = APIClient()
+
     def setUp(self):
         """Configuration avec client API."""
         super().setUp()
-        from rest_framework.test import APIClient
 
-        self.client = APIClient()
+        # Réutiliser le client de la classe sans cookies ni credentials
+        # hérités du test précédent
+        self.api_client.logout()
+        self.client = self.api_client
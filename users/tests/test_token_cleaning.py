@@ -27,9 +27,8 @@ class TestTokenCleaning:
             first_name="John",
             last_name="Doe",
             password="password123",
+            is_active=True,
         )
-        self.user.is_active = True
-        self.user.save()
 
     def test_clean_token_basic(self):
         """Test du nettoyage de base d'un token."""
@@ -162,9 +161,8 @@ class TestSerializerTokenCleaning:
             first_name="John",
             last_name="Doe",
             password="password123",
+            is_active=True,
         )
-        self.user.is_active = True
-        self.user.save()
 
     def test_password_change_confirm_serializer_with_dirty_token(self):
         """Test du serializer de confirmation de changement de mot de passe avec token sale."""
@@ -260,9 +258,8 @@ class TestTokenCleaningIntegration:
             first_name="John",
             last_name="Doe",
             password="password123",
+            is_active=True,
         )
-        self.user.is_active = True
-        self.user.save()
 
     def test_password_change_flow_with_dirty_token(self):
         """Test du flux complet de changement de mot de passe avec token sale."""
@@ -27,9 +27,8 @@ class TestTokenRefresh:
             first_name="John",
             last_name="Doe",
             password="password123",
+            is_active=True,
         )
-        self.user.is_active = True
-        self.user.save()
 
         # Générer des tokens JWT
         self.refresh_token = RefreshToken.for_user(self.user)
@@ -104,9 +103,8 @@ class TestLogout:
             first_name="John",
             last_name="Doe",
             password="password123",
+            is_active=True,
         )
-        self.user.is_active = True
-        self.user.save()
 
         # Générer des tokens JWT
         self.refresh_token = RefreshToken.for_user(self.user)
@@ -245,9 +243,8 @@ class TestTokenManagementIntegration:
             first_name="John",
             last_name="Doe",
             password="password123",
+            is_active=True,
         )
-        self.user.is_active = True
-        self.user.save()
 
     def test_full_authentication_flow(self):
         """Test du flux complet d'authentification avec tokens."""
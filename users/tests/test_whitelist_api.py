@@ -3,6 +3,8 @@ Tests pour l'API de gestion de la liste blanche des numéros de téléphone.
 """
 
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -74,6 +76,29 @@ class PhoneWhitelistAPITestCase(APITestCase, WhitelistAPITestCase):
         # Vérifier qu'on a au moins nos numéros de test
         self.assertGreaterEqual(data["data"]["total_count"], 2)
 
+    def test_whitelist_list_view_query_count_independent_of_size(self):
+        """Test que added_by est chargé par jointure (pas de N+1)."""
+        url = "/api/auth/admin/whitelist/"
+        auth = f"Bearer {self.admin_token}"
+
+        with CaptureQueriesContext(connection) as baseline:
+            self.client.get(url, HTTP_AUTHORIZATION=auth)
+
+        for index in range(3):
+            adder = User.objects.create_user(
+                phone=f"+23767000050{index}",
+                password="adminpassword123",
+                first_name="Admin",
+                last_name=f"User{index}",
+                is_staff=True,
+            )
+            PhoneWhitelist.objects.create(
+                phone=f"+23767000060{index}", added_by=adder, is_active=True
+            )
+
+        with self.assertNumQueries(len(baseline)):
+            self.client.get(url, HTTP_AUTHORIZATION=auth)
+
     def test_whitelist_list_view_unauthorized(self):
         """Test de récupération de la liste blanche sans authentification."""
         url = "/api/auth/admin/whitelist/"
@@ -496,3 +521,27 @@ class PhoneWhitelistAPITestCase(APITestCase, WhitelistAPITestCase):
         self.assertEqual(response_data["status"], "error")
         self.assertEqual(response_data["message"], "Données invalides")
         self.assertIn("phone", response_data["data"])
+
+
+class WhitelistAPITestCaseHelpersTest(APITestCase, WhitelistAPITestCase):
+    """Tests des utilitaires du mixin WhitelistAPITestCase."""
+
+    def setUp(self):
+        """Configuration initiale pour les tests."""
+        super().setUp()
+        self.setUp_whitelist()
+
+    def test_create_test_whitelist(self):
+        """Test que create_test_whitelist fonctionne après setUp_whitelist."""
+        phones = self.create_test_whitelist()
+
+        self.assertEqual(
+            phones,
+            ["+237658552294", "+237658552295", "+237670000001", "+237670000002"],
+        )
+        self.assertEqual(
+            PhoneWhitelist.objects.filter(
+                phone__in=phones, added_by=self.admin_user
+            ).count(),
+            len(phones),
+        )
@@ -41,11 +41,6 @@ class WhitelistTestCase(TestCase):
         # Nettoyer la liste blanche avant chaque test
         PhoneWhitelist.objects.all().delete()
 
-    def tearDown(self):
-        """Nettoyage après chaque test."""
-        PhoneWhitelist.objects.all().delete()
-        super().tearDown()
-
     def add_phone_to_whitelist(
         self, phone: str, notes: str = "Numéro de test"
     ) -> PhoneWhitelist:
@@ -152,11 +147,6 @@ class WhitelistAPITestCase:
         # Nettoyer la liste blanche
         PhoneWhitelist.objects.all().delete()
 
-    def tearDown(self):
-        """Nettoyage après les tests d'API."""
-        PhoneWhitelist.objects.all().delete()
-        super().tearDown()
-
     def add_phone_to_whitelist(
         self, phone: str, notes: str = "Numéro de test"
     ) -> PhoneWhitelist:
@@ -172,6 +162,39 @@ class WhitelistAPITestCase:
             is_active=True,
         )
 
+    @classmethod
+    def add_phones_to_whitelist(cls, phones, added_by) -> list:
+        """
+        Ajoute plusieurs numéros à la liste blanche en un seul INSERT.
+
+        Méthode de classe pour pouvoir être appelée depuis setUpTestData :
+        l'administrateur est passé explicitement, qu'il soit un attribut
+        de classe (setUpTestData) ou d'instance (setUp_whitelist).
+
+        Args:
+            phones: Couples (numéro, notes)
+            added_by: Administrateur qui ajoute les numéros
+
+        Returns:
+            list: Instances PhoneWhitelist créées
+        """
+        entries = []
+        for phone, notes in phones:
+            normalized_phone = normalize_phone(phone)
+            if not normalized_phone:
+                raise ValueError(f"Numéro de téléphone invalide: {phone}")
+
+            entries.append(
+                PhoneWhitelist(
+                    phone=normalized_phone,
+                    added_by=added_by,
+                    notes=notes,
+                    is_active=True,
+                )
+            )
+
+        return PhoneWhitelist.objects.bulk_create(entries)
+
     def create_test_whitelist(self):
         """Crée une liste blanche de base pour les tests."""
         test_phones = [
@@ -181,9 +204,5 @@ class WhitelistAPITestCase:
             ("237670000002", "Numéro de test pour changement"),
         ]
 
-        added_phones = []
-        for phone, notes in test_phones:
-            whitelist_item = self.add_phone_to_whitelist(phone, notes)
-            added_phones.append(whitelist_item.phone)
-
-        return added_phones
+        entries = self.add_phones_to_whitelist(test_phones, self.admin_user)
+        return [item.phone for item in entries]
@@ -6,8 +6,15 @@ des numéros de téléphone pour l'application WaterBill.
 """
 
 import re
+from functools import lru_cache
 from typing import Optional
 
+# Tout caractère qui n'est pas un chiffre
+_NON_DIGIT_RE = re.compile(r"\D")
+
+# Tout caractère qui n'est ni un chiffre ni le préfixe '+'
+_NON_DIGIT_PLUS_RE = re.compile(r"[^\d+]")
+
 
 def normalize_phone(phone: str) -> Optional[str]:
     """
@@ -39,7 +46,7 @@ def normalize_phone(phone: str) -> Optional[str]:
         return None
 
     # Supprimer tous les caractères non numériques sauf +
-    digits = re.sub(r"[^\d+]", "", phone)
+    digits = _NON_DIGIT_PLUS_RE.sub("", phone)
 
     # Ajouter le + si manquant
     if not digits.startswith("+"):
@@ -48,6 +55,27 @@ def normalize_phone(phone: str) -> Optional[str]:
     return digits
 
 
+@lru_cache(maxsize=4096)
+def to_international_phone(phone: str) -> str:
+    """
+    Convertit un numéro en format international en ne gardant que les chiffres.
+
+    Le résultat est mis en cache : les mêmes numéros reviennent à chaque
+    connexion, renvoi ou vérification de code.
+
+    Args:
+        phone: Numéro de téléphone saisi
+
+    Returns:
+        str: Numéro au format international (+XXXXXXXXX)
+
+    Examples:
+        >>> to_international_phone("+237 670-000-000")
+        "+237670000000"
+    """
+    return "+" + _NON_DIGIT_RE.sub("", phone)
+
+
 def validate_phone_length(
     phone: str, min_length: int = 9, max_length: int = 15
 ) -> bool:
@@ -84,4 +112,4 @@ def clean_phone_for_display(phone: str) -> str:
         return ""
 
     # Supprimer tous les caractères non numériques sauf +
-    return re.sub(r"[^\d+]", "", phone)
+    return _NON_DIGIT_PLUS_RE.sub("", phone)
@@ -55,6 +55,9 @@ ALLOWED_HOSTS = ["localhost", "127.0.0.1", "0.0.0.0"]
 # Frontend URL pour les liens de redirection SMS
 FRONTEND_URL = env("FRONTEND_URL")
 
+# Clé secrète (pepper) pour le HMAC des codes SMS de vérification
+SMS_CODE_PEPPER = env("SMS_CODE_PEPPER", default=SECRET_KEY)
+
 
 # Application definition
 
@@ -418,9 +421,10 @@ SIMPLE_JWT = {
 
 # Configuration spécifique pour les tests
 if "test" in sys.argv or "pytest" in sys.modules:
-    # Configuration simplifiée pour les tests
+    # Hasheur rapide pour les tests : chaque create_user et chaque
+    # connexion hashe un mot de passe, Argon2 dominait la durée des tests
     PASSWORD_HASHERS = [
-        "django.contrib.auth.hashers.Argon2PasswordHasher",
+        "django.contrib.auth.hashers.MD5PasswordHasher",
     ]
 
     # Désactiver les migrations pour les tests
@@ -433,6 +437,16 @@ if "test" in sys.argv or "pytest" in sys.modules:
 
     MIGRATION_MODULES = DisableMigrations()
 
+    # SQLite en mémoire pour les runs locaux rapides (TEST_FAST=1) ;
+    # sans la variable, la CI garde PostgreSQL pour la parité avec la prod
+    if os.getenv("TEST_FAST"):
+        DATABASES = {
+            "default": {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": ":memory:",
+            }
+        }
+
     # Cache en mémoire pour les tests
     CACHES = {
         "default": {